@@ -6,7 +6,7 @@ from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QTextEdit, QLabel, QFileDialog, QListWidget, QAbstractItemView,
     QMessageBox, QTableWidget, QTableWidgetItem, QHeaderView, QMenu, QDialog, QRadioButton,
-    QProgressDialog, QCheckBox
+    QProgressDialog, QCheckBox, QFormLayout, QSpinBox, QComboBox, QDoubleSpinBox, QLineEdit
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt5.QtGui import QFont, QColor, QPalette
@@ -15,6 +15,1287 @@ import importlib
 import sys
 import ast
 import importlib.util
+import re
+import hashlib
+import json
+import shlex
+import fnmatch
+import time
+import argparse
+import contextlib
+import ctypes
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+REQUIRED_TC_COLUMNS = ["TC_Name", "Call Type", "SQL/Keyword", "Expected_Result"]
+PARAMETERS_COLUMN = "Parameters"  # optional: JSON list of bind-value sets or "sheet:<name>"
+TAGS_COLUMN = "Tags"  # optional: comma-separated tags, for filter expressions such as tag:smoke
+PRIORITY_COLUMN = "Priority"  # optional: 1 (highest) and up, or high/medium/low; decides what a time budget keeps
+DEFAULT_PRIORITY = 3
+SETUP_SHEET = "Setup"  # optional TC workbook sheet of suite fixtures: Fixture, SQL[, Index]
+STATE_DB_PATH = "pyvalidata_state.db"
+# Separate file: the result cache holds a write transaction open between its batched commits
+JOURNAL_DB_PATH = "pyvalidata_journal.db"
+ALL_TABLES = "*"  # dependency marker for tests that may read any table
+DEFAULT_RUN_OPTIONS = {
+    "test_timeout": 0,  # seconds per test, 0 = unlimited
+    "run_timeout": 0,  # seconds for the whole run, 0 = unlimited
+    "index_advisor": "off",  # "off", "report" (propose only) or "auto" (create + ANALYZE)
+    "advisor_min_rows": 10000,  # tables smaller than this are cheap to scan
+    "advisor_probe_timeout": 10,  # seconds allowed when timing a query before/after indexing
+    "fuse_aggregates": True,  # answer single-table aggregate tests from one shared scan per table
+    "test_order": "fail-first",  # or "as listed"; the report always keeps the listed order
+    "max_failures": 0,  # stop after this many failing tests, 0 = run everything
+    "sample_mode": "off",  # "off", "percent" or "per-key" (smoke run against sampled shadow tables)
+    "sample_percent": 1.0,  # percent of rows kept per table in "percent" mode
+    "sample_key": "",  # partition column for "per-key" mode; tables without it fall back to percent
+    "sample_per_key": 10,  # rows kept per partition key value in "per-key" mode
+    "diff_limit": 0,  # stop a MATCHES diff after this many differing rows, 0 = count them all
+    "update_golden": False,  # rewrite the snapshots of GOLDEN tests instead of comparing with them
+    "failing_rows": 10,  # rows of a failing SQL test's result kept for the report, 0 = none
+    "preflight": "error",  # prepare all SQL first: "off", "report", "error" (skip those tests) or "abort"
+    "isolate_writes": True,  # run mutating SQL tests inside a savepoint that is rolled back afterwards
+    "resume": True,  # continue an interrupted run of the same tests on the same data from its journal
+    "test_filter": "",  # run only the tests matching this expression, e.g. "tag:smoke type:sql -name:*_slow"
+    "changed_only": False,  # run only new or edited tests; the rest keep their last result on the same data
+    "time_budget": 0,  # seconds; run the highest-value tests that fit, predicted from past durations; 0 = off
+    # Resource governor, 0 = no cap: what one query may fetch into Python, and how far SQLite may grow
+    "max_fetch_rows": 0,  # rows one query may stream into Python (also caps the manual SQL result table)
+    "max_fetch_mb": 0,  # estimated MB one query may stream into Python
+    "sqlite_heap_mb": 0,  # MB SQLite may allocate during the run above what it holds when the tests start
+    "temp_store_mb": 0,  # MB the TEMP schema (temp tables and their indexes) may grow by during the run
+}
+SAMPLE_HASH_MODULUS = 1000003  # prime; rowids are spread over it with a multiplicative hash
+FAILURE_STATUSES = ("FAIL", "ERROR", "TIMEOUT", "LIMIT")
+MAX_FUSED_AGGREGATES = 500  # aggregates per fused query, well under SQLite's column limit
+PROGRESS_HANDLER_OPS = 10000  # SQLite VM instructions between limit checks
+SLOWEST_TESTS_COUNT = 20
+FETCH_BATCH_ROWS = 1000
+MB = 1024 * 1024
+MAX_RESULT_TEXT = 2000  # characters of any result text kept in the report
+DIFF_SAMPLE_ROWS = 10  # differing rows quoted in the details of a MATCHES test
+GOLDEN_DIR = "golden_snapshots"  # one snapshot file per GOLDEN test
+JOURNAL_RETENTION_DAYS = 7  # journals of interrupted runs that were never resumed are dropped after this
+# (header, result key) for the columns of the on-screen report table
+REPORT_TABLE_COLUMNS = [
+    ("Suite", "Suite"),
+    ("TC Name", "TC Name"),
+    ("Status", "Status"),
+    ("Expected Result", "Expected Result"),
+    ("Actual Result", "Actual Result"),
+    ("Error/Details", "Error/Details"),
+    ("Time (s)", "Duration (s)"),
+    ("Rows", "Rows Fetched"),
+    ("Bytes", "Bytes Fetched"),
+]
+RESULT_CACHE_VERSION = 1
+
+# Authorizer actions that never change the database
+_READ_ONLY_ACTIONS = {sqlite3.SQLITE_READ, sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+_TABLE_REFERENCE_RE = re.compile(
+    r'\b(?:from|join|into|update|table)\s+("(?:[^"]|"")+"|\[[^\]]+\]|`[^`]+`|[\w.]+)', re.IGNORECASE
+)
+
+# "MATCHES <table or query> [KEY col, ...]": the test's result is diffed against another result
+_DIFF_EXPECTATION_RE = re.compile(r"^\s*MATCHES\s+(.+?)(?:\s+KEY\s+([\w\"\s,]+))?\s*$", re.IGNORECASE | re.DOTALL)
+_CREATED_TABLE_RE = re.compile(
+    r'\bcreate\s+(?:temp\w*\s+)?(?:table|view)\s+(?:if\s+not\s+exists\s+)?("(?:[^"]|"")+"|\[[^\]]+\]|`[^`]+`|[\w.]+)',
+    re.IGNORECASE
+)
+_SQL_LITERAL_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def normalize_sql(sql):
+    # Collapse whitespace and case outside quoted literals/identifiers so that the
+    # same query written on one or several lines shares a cache key.
+    parts = _SQL_LITERAL_RE.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i]).lower()
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+_PLAN_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\S+)')
+_PLAN_AUTO_INDEX_RE = re.compile(r'^SEARCH (?:TABLE )?(\S+) USING AUTOMATIC (?:COVERING |PARTIAL )*INDEX \((.+)\)')
+_FROM_ITEM_RE = re.compile(
+    r'\b(?:from|join)\s+("(?:[^"]|"")+"|[\w.]+)(?:\s+(?:as\s+)?(?!(?:where|join|on|inner|left|right|full|cross|'
+    r'natural|group|order|limit|using|union|except|intersect)\b)(\w+))?', re.IGNORECASE
+)
+_FUSABLE_AGGREGATE_RE = re.compile(
+    r'^select (count|sum|min|max|avg|total) ?\( ?(\*|[^()]+?) ?\) from ("(?:[^"]|"")+"|[\w.]+)(?: where (.+))?$'
+)
+_UNFUSABLE_KEYWORD_RE = re.compile(r'\b(?:select|group|order|limit|having|union|except|intersect|join|over|distinct)\b|;')
+_PREDICATE_RE = re.compile(r'(?:(\w+|"[^"]+")\.)?(\w+|"[^"]+")\s*(?:==?|<=|>=|<|>|\bin\b|\blike\b|\bbetween\b)', re.IGNORECASE)
+_PREDICATE_RHS_RE = re.compile(r'(?:==?|<=|>=|<|>)\s*(\w+|"[^"]+")\.(\w+|"[^"]+")')
+
+
+def lexical_table_names(sql):
+    # Fallback for SQL that cannot be prepared, e.g. because a table is missing
+    return {name.strip('"[]`').replace('""', '"') for name in _TABLE_REFERENCE_RE.findall(sql)}
+
+
+def analyze_sql(db_conn, sql, params=()):
+    """Prepare sql (via EXPLAIN, nothing runs) and return (tables_read, writes)."""
+    tables_read = set()
+    writes = []
+
+    def authorizer(action, arg1, arg2, db_name, trigger_name):
+        if action == sqlite3.SQLITE_READ and arg1 and not arg1.startswith("sqlite_"):
+            tables_read.add(arg1)
+        elif action not in _READ_ONLY_ACTIONS:
+            writes.append(action)
+        return sqlite3.SQLITE_OK
+
+    db_conn.set_authorizer(authorizer)
+    try:
+        db_conn.execute("EXPLAIN " + sql, params)
+    except sqlite3.Error:
+        return lexical_table_names(sql), True
+    finally:
+        db_conn.set_authorizer(None)
+    return tables_read, bool(writes)
+
+
+# Functions whose result differs between runs on the same data; date/time ones only with 'now'
+_VOLATILE_FUNCTIONS = {"random", "randomblob", "changes", "total_changes", "last_insert_rowid",
+                       "current_timestamp", "current_date", "current_time"}
+_DATE_FUNCTIONS = {"date", "time", "datetime", "julianday", "strftime", "unixepoch", "timediff"}
+_NOW_RE = re.compile(r"'now'|\b(?:date|time|datetime|julianday|unixepoch)\s*\(\s*\)", re.IGNORECASE)
+
+
+def volatile_sql(db_conn, sql, params=()):
+    """Whether sql calls a function such as random() or date('now'), so its result cannot be reused."""
+    functions = set()
+
+    def authorizer(action, arg1, arg2, db_name, trigger_name):
+        if action == sqlite3.SQLITE_FUNCTION and arg2:
+            functions.add(arg2.lower())
+        return sqlite3.SQLITE_OK
+
+    db_conn.set_authorizer(authorizer)
+    try:
+        db_conn.execute("EXPLAIN " + sql, params)
+    except sqlite3.Error:
+        return True
+    finally:
+        db_conn.set_authorizer(None)
+    if functions & _VOLATILE_FUNCTIONS:
+        return True
+    if not functions & _DATE_FUNCTIONS:
+        return False
+    # 'now' may also come from a bound value or a view the query reads
+    values = params.values() if isinstance(params, dict) else params
+    views = db_conn.execute("SELECT group_concat(sql, ' ') FROM sqlite_master WHERE type = 'view'").fetchone()[0]
+    return bool(_NOW_RE.search(sql) or _NOW_RE.search(views or "")
+                or any(isinstance(value, str) and value.strip().lower() == "now" for value in values))
+
+
+def preflight_problem(message):
+    if message.startswith("no such table"):
+        return "missing table"
+    if message.startswith("no such column"):
+        return "missing column"
+    if "syntax error" in message or message.startswith("incomplete input") or "unrecognized token" in message:
+        return "syntax error"
+    return "cannot prepare"
+
+
+def plan_index_candidates(db_conn, sql, params=()):
+    """Return [(table, columns)] that EXPLAIN QUERY PLAN shows being scanned without an index."""
+    aliases = {}
+    for table, alias in _FROM_ITEM_RE.findall(sql):
+        table = table.strip('"').replace('""', '"')
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    predicates = [(q.strip('"'), c.strip('"')) for q, c in _PREDICATE_RE.findall(sql) + _PREDICATE_RHS_RE.findall(sql)]
+
+    candidates = []
+    for _, _, _, detail in db_conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall():
+        auto_match = _PLAN_AUTO_INDEX_RE.match(detail)
+        scan_match = _PLAN_SCAN_RE.match(detail)
+        if auto_match:
+            # SQLite builds a throwaway index on every execution: make it permanent
+            name = auto_match.group(1)
+            columns = tuple(part.split("=")[0].strip() for part in auto_match.group(2).split(" AND "))
+        elif scan_match:
+            name = scan_match.group(1)
+            columns = None
+        else:
+            continue
+        table = aliases.get(name, name)
+        table_columns = {row[1] for row in db_conn.execute(f'PRAGMA table_info("{table}")')}
+        if not table_columns:
+            continue
+        if columns is None:
+            filter_columns = [column for qualifier, column in predicates
+                              if column in table_columns and qualifier in ("", name, table)]
+            if not filter_columns:
+                continue  # a scan with nothing to filter on cannot use an index
+            columns = (filter_columns[0],)
+        if all(column in table_columns for column in columns):
+            candidates.append((table, columns))
+    return candidates
+
+
+def fusable_aggregate(sql):
+    """Split 'SELECT <agg>(x) FROM t [WHERE cond]' into (table, conditional aggregate), else None."""
+    match = _FUSABLE_AGGREGATE_RE.match(normalize_sql(sql))
+    if not match:
+        return None
+    func, argument, table, condition = match.groups()
+    # Keywords must be checked outside string literals only
+    outside_literals = _SQL_LITERAL_RE.split(f"{argument} {condition or ''}")[::2]
+    if any(_UNFUSABLE_KEYWORD_RE.search(part) for part in outside_literals):
+        return None
+    if condition is None:
+        expression = f"{func}({argument})"
+    elif argument == "*":
+        # COUNT(CASE ...) keeps COUNT(*)'s 0 for no matching rows
+        expression = f"count(case when ({condition}) then 1 end)"
+    else:
+        expression = f"{func}(case when ({condition}) then {argument} end)"
+    return table.strip('"').replace('""', '"'), expression
+
+
+def indexed_leading_columns(db_conn, table_name):
+    leading = set()
+    for index_row in db_conn.execute(f'PRAGMA index_list("{table_name}")').fetchall():
+        info = db_conn.execute(f'PRAGMA index_info("{index_row[1]}")').fetchall()
+        if info:
+            leading.add(info[0][2])
+    return leading
+
+
+def user_tables(db_conn):
+    cursor = db_conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+    return sorted(row[0] for row in cursor.fetchall())
+
+
+def db_state(db_conn):
+    # total_changes catches DML, schema_version catches DDL (CREATE/DROP/ALTER)
+    schema_version = db_conn.execute("PRAGMA schema_version").fetchone()[0]
+    return db_conn.total_changes, schema_version
+
+
+def table_fingerprint(db_conn, table_name):
+    digest = hashlib.sha1()
+    cursor = db_conn.execute(f'SELECT * FROM "{table_name}"')
+    digest.update(repr([desc[0] for desc in cursor.description]).encode())
+    while True:
+        rows = cursor.fetchmany(5000)
+        if not rows:
+            break
+        digest.update(repr(rows).encode())
+    return digest.hexdigest()
+
+
+def dataframe_fingerprint(df):
+    try:
+        digest = hashlib.sha1(repr(list(df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        return digest.hexdigest()
+    except Exception:
+        # Unhashable cell values: the engine falls back to scanning the table
+        return None
+
+
+def data_table_name(file_path, sheet_name):
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    table_name = f'{base_name}.{sheet_name}'
+    return "".join(c for c in table_name if c.isalnum() or c in ['.', '_'])
+
+
+def load_validation_module(file_path):
+    spec = importlib.util.spec_from_file_location("validation_functions", file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bounded_text(text, limit=MAX_RESULT_TEXT):
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text):,} characters]"
+
+
+def estimate_result_bytes(rows):
+    total = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (str, bytes)):
+                total += len(value)
+            elif value is not None:
+                total += 8
+    return total
+
+
+def performance_summary(results, top_n=SLOWEST_TESTS_COUNT):
+    timed = [result for result in results if "Duration (s)" in result]
+    slowest = sorted(timed, key=lambda result: result["Duration (s)"], reverse=True)[:top_n]
+    slowest_rows = [
+        {key: result[key] for key in ("TC Name", "Status", "Duration (s)", "Rows Fetched", "Bytes Fetched", "Tables Read")}
+        for result in slowest
+    ]
+    table_totals = {}
+    for result in timed:
+        tables = [table for table in result.get("Tables Read", "").split(", ") if table] or ["(none)"]
+        # A test's time is shared evenly by the tables it reads
+        for table in tables:
+            label = "(keyword: any table)" if table == ALL_TABLES else table
+            totals = table_totals.setdefault(label, {"Table": label, "Tests": 0, "Total Time (s)": 0.0})
+            totals["Tests"] += 1
+            totals["Total Time (s)"] += result["Duration (s)"] / len(tables)
+    table_rows = sorted(table_totals.values(), key=lambda totals: totals["Total Time (s)"], reverse=True)
+    for totals in table_rows:
+        totals["Total Time (s)"] = round(totals["Total Time (s)"], 4)
+    return slowest_rows, table_rows
+
+
+def failing_rows_sheet(results):
+    rows = []
+    for result in results:
+        captured = result.get("Failing Rows")
+        if not captured:
+            continue
+        # A result column named like the sheet's own columns (or like an earlier one) is renamed, not overwritten
+        columns = []
+        for column in captured["columns"]:
+            name, number = column, 1
+            while name in ("TC Name", "Row #") or name in columns:
+                number += 1
+                name = f"{column} ({number})"
+            columns.append(name)
+        for row_number, values in enumerate(captured["rows"], start=1):
+            row = {"TC Name": result["TC Name"], "Row #": row_number}
+            row.update(zip(columns, values))
+            rows.append(row)
+    return rows
+
+
+def write_report(file_path, results, extra_sheets=None):
+    slowest_rows, table_rows = performance_summary(results)
+    report_rows = [{key: value for key, value in result.items() if key != "Failing Rows"} for result in results]
+    with pd.ExcelWriter(file_path) as writer:
+        pd.DataFrame(report_rows).to_excel(writer, sheet_name="Report", index=False)
+        pd.DataFrame(slowest_rows).to_excel(writer, sheet_name="Slowest Tests", index=False)
+        pd.DataFrame(table_rows).to_excel(writer, sheet_name="Time by Table", index=False)
+        suites = suite_summary(results)
+        if len(suites) > 1:
+            pd.DataFrame(suites).to_excel(writer, sheet_name="Suites", index=False)
+        failing_rows = failing_rows_sheet(results)
+        if failing_rows:
+            pd.DataFrame(failing_rows).to_excel(writer, sheet_name="Failing Rows", index=False)
+        for sheet_name, rows in (extra_sheets or {}).items():
+            if rows:
+                pd.DataFrame(rows).to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def write_partial_report(file_path, journal_path=JOURNAL_DB_PATH):
+    journal = RunJournal(journal_path)
+    try:
+        results = journal.latest()
+    finally:
+        journal.close()
+    if results:
+        write_report(file_path, results)
+    return len(results)
+
+
+def parse_shard(spec):
+    try:
+        shard, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"--shard expects i/n, e.g. 2/4, got '{spec}'")
+    if not 1 <= shard <= count:
+        raise ValueError(f"Shard {shard}/{count} is out of range: i must be between 1 and n")
+    return shard, count
+
+
+def report_durations(file_path):
+    durations = {}
+    for row in report_sheet_rows(pd.read_excel(file_path, sheet_name="Report")):
+        key = (row.get("Suite", ""), str(row["TC Name"]))
+        durations[key] = durations.get(key, 0.0) + float(row["Duration (s)"] or 0.0)
+    return durations
+
+
+def shard_positions(test_cases, shard, shard_count, durations=None):
+    """Positions of test_cases in shard (1-based) of shard_count: hashed by name, or balanced by durations."""
+    groups = {}
+    for position, tc in enumerate(test_cases):
+        groups.setdefault((tc.get("Suite", ""), str(tc['TC_Name'])), []).append(position)
+    digests = {key: int(hashlib.sha1(json.dumps(key).encode()).hexdigest(), 16) for key in groups}
+    if durations:
+        known = sorted(durations[key] for key in groups if key in durations)
+        typical = known[len(known) // 2] if known else 1.0
+        estimate = {key: durations.get(key, typical) for key in groups}
+        loads = [0.0] * shard_count
+        assigned = {}
+        # The digest breaks ties, so every host computes the same assignment
+        for key in sorted(groups, key=lambda key: (-estimate[key], digests[key])):
+            target = loads.index(min(loads))
+            assigned[key] = target
+            loads[target] += estimate[key]
+    else:
+        assigned = {key: digests[key] % shard_count for key in groups}
+    return sorted(position for key, positions in groups.items() if assigned[key] == shard - 1
+                  for position in positions)
+
+
+def report_sheet_rows(df):
+    # Empty cells come back as NaN; the report wrote them as empty strings
+    return df.astype(object).where(df.notna(), "").to_dict("records")
+
+
+def merge_shard_reports(file_paths, output_path):
+    """Combine every shard's report into the report of the whole run; returns the test count."""
+    results_by_position = {}
+    extra_sheets = {}
+    shard_count = total = None
+    seen_shards = set()
+    for file_path in file_paths:
+        sheets = pd.read_excel(file_path, sheet_name=None)
+        if "Shard" not in sheets:
+            raise ValueError(f"'{file_path}' is not a shard report (it has no Shard sheet)")
+        shard_rows = report_sheet_rows(sheets["Shard"])
+        shard, count = parse_shard(str(shard_rows[0]["Shard"]))
+        total = shard_rows[0]["Tests in Run"]
+        # An empty shard has a single row without a position
+        placements = [row for row in shard_rows if row["Position"] != ""]
+        results = report_sheet_rows(sheets["Report"]) if placements else []
+        if len(results) != len(placements):
+            raise ValueError(f"'{file_path}' has {len(results)} results for {len(placements)} shard positions")
+        if shard_count not in (None, count):
+            raise ValueError(f"'{file_path}' is shard {shard}/{count}, but other reports are split into {shard_count}")
+        if shard in seen_shards:
+            raise ValueError(f"Shard {shard}/{count} is given twice")
+        shard_count = count
+        seen_shards.add(shard)
+        failing_rows = report_sheet_rows(sheets["Failing Rows"]) if "Failing Rows" in sheets else []
+        attach_failing_rows(results, failing_rows, list(sheets.get("Failing Rows", pd.DataFrame()).columns))
+        for placement, result in zip(placements, results):
+            results_by_position[placement["Position"]] = result
+        for sheet_name, df in sheets.items():
+            if sheet_name in ("Report", "Slowest Tests", "Time by Table", "Suites", "Failing Rows", "Shard"):
+                continue
+            rows = extra_sheets.setdefault(sheet_name, [])
+            # Setup work such as fixtures is repeated by every shard; report it once
+            rows.extend(row for row in report_sheet_rows(df) if row not in rows)
+    missing = sorted(set(range(1, shard_count + 1)) - seen_shards) if shard_count else []
+    if missing:
+        raise ValueError(f"Missing shard report(s): {', '.join(f'{shard}/{shard_count}' for shard in missing)}")
+    if total is not None and len(results_by_position) != total:
+        raise ValueError(f"The shards hold {len(results_by_position)} results, but the run has {total} tests")
+    results = [results_by_position[position] for position in sorted(results_by_position)]
+    write_report(output_path, results, extra_sheets)
+    return len(results)
+
+
+def attach_failing_rows(results, failing_rows, columns):
+    """Rebuild each result's "Failing Rows" from the flattened sheet failing_rows_sheet() wrote."""
+    value_columns = [column for column in columns if column not in ("TC Name", "Row #")]
+    blocks = []
+    for row in failing_rows:
+        if row["Row #"] == 1:
+            blocks.append([])
+        blocks[-1].append(row)
+    candidates = iter(result for result in results if result["Status"] in FAILURE_STATUSES)
+    for block in blocks:
+        result = next((result for result in candidates if result["TC Name"] == block[0]["TC Name"]), None)
+        if result is None:
+            break
+        kept = [column for column in value_columns if any(row[column] != "" for row in block)]
+        result["Failing Rows"] = {"columns": kept, "rows": [[row[column] for column in kept] for row in block]}
+
+
+def environment_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith((".xlsx", ".xls")) and not name.startswith("~$")))
+        else:
+            files.append(path)
+    return files
+
+
+def load_data_files(db_conn, file_paths, log=print):
+    table_fingerprints = {}
+    for file_path in file_paths:
+        with pd.ExcelFile(file_path) as xls:
+            for sheet_name in xls.sheet_names:
+                df = pd.read_excel(xls, sheet_name=sheet_name)
+                table_name = data_table_name(file_path, sheet_name)
+                df.to_sql(table_name, db_conn, if_exists='replace', index=False)
+                table_fingerprints[table_name] = dataframe_fingerprint(df)
+                if log:
+                    log(f"Loaded '{sheet_name}' from '{os.path.basename(file_path)}' into table '{table_name}'")
+    return table_fingerprints
+
+
+class PipelinedLoader:
+    """Parses data files on a background thread while the tests whose tables are loaded run."""
+
+    def __init__(self, file_paths, log=print):
+        self.log = log
+        self.sheets = {}  # table name -> (file path, sheet name), in file order
+        digest = hashlib.sha1()
+        for file_path in file_paths:
+            with open(file_path, "rb") as source:
+                digest.update(hashlib.sha1(source.read()).digest())
+            # Only the workbook's sheet list is read here
+            with pd.ExcelFile(file_path) as xls:
+                for sheet_name in xls.sheet_names:
+                    self.sheets[data_table_name(file_path, sheet_name)] = (file_path, sheet_name)
+        digest.update(json.dumps(list(self.sheets)).encode())
+        self.files_digest = digest.hexdigest()
+        self.order = list(self.sheets)
+        self.loaded = {}  # table name -> fingerprint
+        self.report = []
+        self.parsed = queue.Queue()
+        self.thread = None
+        self.started = None
+
+    def tables_needed(self, tc, fixture_names=()):
+        """The tables of this load that tc reads, as far as its text shows."""
+        if tc['Call Type'] != "SQL":
+            # A keyword may read any table
+            return set(self.sheets)
+        sqls = [tc['SQL/Keyword']]
+        if expectation_kind(tc['Expected_Result']) == "diff":
+            sqls.append(parse_diff_expectation(tc['Expected_Result'])[0])
+        names = {name.lower() for sql in sqls for name in lexical_table_names(sql)}
+        if names & {name.lower() for name in fixture_names}:
+            # Fixtures are built once everything is loaded
+            return set(self.sheets)
+        return {table for table in self.sheets if table.lower() in names}
+
+    def plan(self, needs):
+        """Order the tables so that each next one unblocks the most tests; needs holds one set per test."""
+        blocked = [set(tables) for tables in needs if tables]
+        remaining = list(self.sheets)
+        order = []
+        while remaining:
+            # Tests waiting for this table alone first, then tests waiting for it at all
+            table = max(remaining, key=lambda table: (sum(1 for tables in blocked if tables == {table}),
+                                                      sum(1 for tables in blocked if table in tables)))
+            unblocked = sum(1 for tables in blocked if tables == {table})
+            self.report.append({"Table": table, "Load Order": len(order) + 1, "Tests Unblocked": unblocked,
+                                "Parse Time (s)": "", "Ready At (s)": "", "Error": ""})
+            order.append(table)
+            remaining.remove(table)
+            blocked = [tables - {table} for tables in blocked if tables - {table}]
+        self.order = order
+
+    def start(self):
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self.parse_sheets, daemon=True)
+        self.thread.start()
+
+    def parse_sheets(self):
+        workbooks = {}
+        try:
+            for table in self.order:
+                file_path, sheet_name = self.sheets[table]
+                started = time.monotonic()
+                try:
+                    if file_path not in workbooks:
+                        workbooks[file_path] = pd.ExcelFile(file_path)
+                    self.parsed.put((table, pd.read_excel(workbooks[file_path], sheet_name=sheet_name), None,
+                                     time.monotonic() - started))
+                except Exception as e:
+                    self.parsed.put((table, None, str(e), time.monotonic() - started))
+        finally:
+            for xls in workbooks.values():
+                xls.close()
+
+    def wait_for(self, db_conn, tables, should_stop=None):
+        """Write parsed sheets into db_conn until all of tables are loaded; returns the seconds spent waiting."""
+        waited = 0.0
+        while not set(tables) <= set(self.loaded):
+            started = time.monotonic()
+            try:
+                table, df, error, parse_time = self.parsed.get(timeout=0.2)
+            except queue.Empty:
+                waited += time.monotonic() - started
+                if should_stop and should_stop():
+                    break
+                continue
+            waited += time.monotonic() - started
+            row = next(row for row in self.report if row["Table"] == table)
+            row["Parse Time (s)"] = round(parse_time, 4)
+            if error is None:
+                df.to_sql(table, db_conn, if_exists='replace', index=False)
+                self.loaded[table] = dataframe_fingerprint(df)
+                if self.log:
+                    file_path, sheet_name = self.sheets[table]
+                    self.log(f"Loaded '{sheet_name}' from '{os.path.basename(file_path)}' into table '{table}'")
+            else:
+                # Its tests run anyway and report the missing table
+                self.loaded[table] = None
+                row["Error"] = error
+                if self.log:
+                    self.log(f"Could not load table '{table}': {error}")
+            row["Ready At (s)"] = round(time.monotonic() - self.started, 4)
+        return waited
+
+
+def run_environment(file_paths, test_cases, fixtures, validation_lib, options, result_cache, should_stop=None,
+                    pipeline=False):
+    db_conn = sqlite3.connect(":memory:", check_same_thread=False)
+    try:
+        if pipeline:
+            engine = ValidationEngine(db_conn, validation_lib, result_cache, None, options, fixtures=fixtures,
+                                      loader=PipelinedLoader(file_paths, log=None))
+        else:
+            table_fingerprints = load_data_files(db_conn, file_paths, log=None)
+            engine = ValidationEngine(db_conn, validation_lib, result_cache, table_fingerprints, options,
+                                      fixtures=fixtures)
+        return engine.run(test_cases, should_stop=should_stop)
+    finally:
+        db_conn.close()
+
+
+def run_matrix(environments, test_cases, fixtures, validation_lib, options, use_cache, should_stop=None,
+               pipeline=False):
+    """Run the same prepared tests against every environment ({name: file paths}) in parallel."""
+    options = dict(options, sqlite_heap_mb=0)  # the heap limit is process-wide, not per environment
+    result_cache = ResultCache() if use_cache else None
+    try:
+        with ThreadPoolExecutor(max_workers=len(environments)) as pool:
+            futures = {
+                name: pool.submit(run_environment, environment_files(paths), test_cases, fixtures, validation_lib,
+                                  options, result_cache, should_stop, pipeline)
+                for name, paths in environments.items()
+            }
+            return {name: future.result() for name, future in futures.items()}
+    finally:
+        if result_cache is not None:
+            result_cache.close()
+
+
+def matrix_rows(results_by_environment):
+    rows = {}
+    for environment, results in results_by_environment.items():
+        seen = {}
+        for result in results:
+            name = (result.get("Suite", ""), str(result["TC Name"]))
+            occurrence = seen[name] = seen.get(name, 0) + 1
+            row = rows.setdefault(name + (occurrence,), {"Suite": name[0], "TC Name": name[1]})
+            row[environment] = result["Status"]
+            row[f"{environment} Actual"] = result["Actual Result"]
+    for row in rows.values():
+        statuses = [row.get(environment, "NOT RUN") for environment in results_by_environment]
+        row["Same Everywhere"] = "yes" if len(set(statuses)) == 1 else "no"
+    return list(rows.values())
+
+
+def write_matrix_report(file_path, results_by_environment):
+    with pd.ExcelWriter(file_path) as writer:
+        pd.DataFrame(matrix_rows(results_by_environment)).to_excel(writer, sheet_name="Matrix", index=False)
+        for environment, results in results_by_environment.items():
+            report_rows = [{key: value for key, value in result.items() if key != "Failing Rows"} for result in results]
+            pd.DataFrame(report_rows).to_excel(writer, sheet_name=f"Report {environment}"[:31], index=False)
+
+
+def test_case_key(tc):
+    # Identifies a test across runs, independent of its row position
+    key_parts = [str(tc['TC_Name']), tc['Call Type'], normalize_sql(tc['SQL/Keyword'])]
+    if tc.get("Suite"):
+        key_parts.append(tc["Suite"])
+    return hashlib.sha1(json.dumps(key_parts).encode()).hexdigest()
+
+
+def bind_value(value):
+    # numpy scalars and Timestamps from Excel cannot be bound as they are
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    if isinstance(value, (int, float, str, bytes)):
+        return value
+    return str(value)
+
+
+def parameter_sets(cell, sheets):
+    """Bind-value sets (tuples or dicts) of a Parameters cell: a JSON list or "sheet:<name>"."""
+    cell = str(cell).strip()
+    if cell.lower().startswith("sheet:"):
+        sheet_name = cell[len("sheet:"):].strip()
+        if sheet_name not in sheets:
+            raise ValueError(f"Parameter sheet '{sheet_name}' not found in the test case file")
+        sheet = sheets[sheet_name]
+        return [{str(column): bind_value(value) for column, value in row.items()} for _, row in sheet.iterrows()]
+    values = json.loads(cell)
+    if not isinstance(values, list):
+        raise ValueError("Parameters must be a JSON list or sheet:<name>")
+    return [value if isinstance(value, dict) else tuple(value) if isinstance(value, list) else (value,)
+            for value in values]
+
+
+def parameter_label(params):
+    if isinstance(params, dict):
+        return ", ".join(f"{name}={value}" for name, value in params.items())
+    return ", ".join(str(value) for value in params)
+
+
+def prepare_fixtures(sheets):
+    setup = (sheets or {}).get(SETUP_SHEET)
+    if setup is None:
+        return []
+    fixtures = []
+    for _, row in setup.iterrows():
+        if pd.isna(row.get("Fixture")) or pd.isna(row.get("SQL")):
+            continue
+        index_cell = row.get("Index")
+        indexes = []
+        if isinstance(index_cell, str) and index_cell.strip():
+            indexes = [[column.strip() for column in group.split(",") if column.strip()]
+                       for group in index_cell.split(";") if group.strip()]
+        fixtures.append({
+            "Fixture": str(row["Fixture"]).strip(),
+            "SQL": str(row["SQL"]).strip().rstrip(";"),
+            "Indexes": indexes,
+        })
+    return fixtures
+
+
+def fixture_dependents(db_conn, changed_tables):
+    """Return the fixtures built (directly or through other fixtures) from any of changed_tables."""
+    try:
+        rows = db_conn.execute("SELECT name, sources FROM temp.pvd_fixtures").fetchall()
+    except sqlite3.Error:
+        return set()
+    sources = {name: set(json.loads(source_list)) for name, source_list in rows}
+    affected = set()
+    changed = set(changed_tables)
+    while True:
+        newly = {name for name, tables in sources.items() if name not in affected and tables & (changed | affected)}
+        if not newly:
+            return affected
+        affected |= newly
+
+
+def load_test_suites(file_paths):
+    suites = []
+    labels = set()
+    for file_path in file_paths:
+        sheets = pd.read_excel(file_path, sheet_name=None)
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        tc_sheets = [name for name, df in sheets.items() if all(col in df.columns for col in REQUIRED_TC_COLUMNS)]
+        if not tc_sheets:
+            raise ValueError(f"'{os.path.basename(file_path)}' has no sheet with columns: {', '.join(REQUIRED_TC_COLUMNS)}")
+        for sheet_name in tc_sheets:
+            label = base_name if len(tc_sheets) == 1 else f"{base_name}/{sheet_name}"
+            unique_label, number = label, 2
+            while unique_label in labels:
+                unique_label, number = f"{label} ({number})", number + 1
+            labels.add(unique_label)
+            suites.append({"Suite": unique_label, "Test Cases": sheets[sheet_name], "Sheets": sheets})
+    return suites
+
+
+def suites_dataframe(suites):
+    frames = [suite["Test Cases"].assign(Suite=suite["Suite"]) for suite in suites]
+    combined = pd.concat(frames, ignore_index=True)
+    return combined[["Suite"] + [column for column in combined.columns if column != "Suite"]]
+
+
+def prepare_suite_test_cases(suites):
+    test_cases = []
+    fixtures = {}
+    for suite in suites:
+        for tc in prepare_test_cases(suite["Test Cases"], suite["Sheets"]):
+            tc["Suite"] = suite["Suite"]
+            test_cases.append(tc)
+        for fixture in prepare_fixtures(suite["Sheets"]):
+            fixtures.setdefault(fixture["Fixture"], fixture)
+    return test_cases, list(fixtures.values())
+
+
+def suite_summary(results):
+    summary = {}
+    for result in results:
+        row = summary.setdefault(result.get("Suite", ""), {"Suite": result.get("Suite", ""), "Tests": 0, "PASS": 0,
+                                                            "FAIL": 0, "ERROR": 0, "Other": 0, "Time (s)": 0.0})
+        row["Tests"] += 1
+        row[result["Status"] if result["Status"] in ("PASS", "FAIL", "ERROR") else "Other"] += 1
+        row["Time (s)"] += result.get("Duration (s)", 0.0)
+    for row in summary.values():
+        row["Time (s)"] = round(row["Time (s)"], 4)
+    return list(summary.values())
+
+
+def prepare_test_cases(test_cases_df, sheets=None):
+    test_cases = []
+    for _, tc in test_cases_df.iterrows():
+        prepared = {
+            "TC_Name": tc['TC_Name'],
+            "Call Type": str(tc['Call Type']).strip().upper(),
+            "SQL/Keyword": str(tc['SQL/Keyword']).strip(),
+            "Expected_Result": str(tc['Expected_Result']).strip(),
+        }
+        priority = parse_priority(tc.get(PRIORITY_COLUMN))
+        if priority is not None:
+            prepared["Priority"] = priority
+        tags = tc.get(TAGS_COLUMN)
+        if isinstance(tags, str) and tags.strip():
+            prepared["Tags"] = [tag.strip() for tag in tags.split(",") if tag.strip()]
+        cell = tc.get(PARAMETERS_COLUMN)
+        if cell is None or (not isinstance(cell, str) and pd.isna(cell)) or not str(cell).strip():
+            test_cases.append(prepared)
+            continue
+        try:
+            sets = parameter_sets(cell, sheets or {})
+        except (ValueError, TypeError) as e:
+            # Reported as an ERROR row by the engine
+            test_cases.append(dict(prepared, **{"Parameter Error": str(e)}))
+            continue
+        for params in sets:
+            expected_result = prepared["Expected_Result"]
+            if isinstance(params, dict) and "Expected_Result" in params:
+                params = dict(params)
+                expected_result = str(params.pop("Expected_Result")).strip()
+            test_cases.append(dict(
+                prepared,
+                TC_Name=f"{prepared['TC_Name']}[{parameter_label(params)}]",
+                Expected_Result=expected_result,
+                Parameters=params,
+            ))
+    return test_cases
+
+
+def parse_priority(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    text = str(value).strip().lower()
+    if text in ("high", "medium", "low"):
+        return {"high": 1, "medium": 2, "low": 3}[text]
+    try:
+        return int(float(text.lstrip("p")))
+    except ValueError:
+        return None
+
+
+def parse_test_filter(expression):
+    """Parse e.g. 'tag:smoke,nightly type:sql -name:*_slow' into (field, patterns, exclude) terms."""
+    terms = []
+    for token in shlex.split(expression):
+        exclude = token.startswith("-")
+        field, separator, patterns = token.lstrip("-").partition(":")
+        if not separator:
+            field, patterns = "name", field
+        field = field.lower()
+        if field not in ("name", "tag", "type", "suite"):
+            raise ValueError(f"Unknown filter field '{field}' (use name, tag, type or suite)")
+        terms.append((field, [pattern.lower() for pattern in patterns.split(",") if pattern], exclude))
+    return terms
+
+
+def select_test_cases(test_cases, expression):
+    terms = parse_test_filter(expression)
+    selected = []
+    for tc in test_cases:
+        fields = {"name": [str(tc['TC_Name'])], "tag": tc.get("Tags", []), "type": [tc['Call Type']],
+                  "suite": [tc.get("Suite", "")]}
+        if all(any(fnmatch.fnmatchcase(value.lower(), pattern) for value in fields[field] for pattern in patterns)
+               != exclude for field, patterns, exclude in terms):
+            selected.append(tc)
+    return selected
+
+
+def expectation_kind(expected_result):
+    if _DIFF_EXPECTATION_RE.match(expected_result):
+        return "diff"
+    if expected_result.upper() == "GOLDEN":
+        return "golden"
+    if "0 rows" in expected_result:
+        return "zero_rows"
+    if expected_result.startswith("COUNT = "):
+        return "count"
+    if expected_result.lower() == "no records":
+        return "no_records"
+    if expected_result.lower() == "records exist":
+        return "records_exist"
+    # A single value, or the text of the whole result set
+    return "value"
+
+
+class QueryOutcome:
+    """Bounded summary of a result set, built while streaming it in batches."""
+
+    def __init__(self, columns, track_text=True, expected_text=None, keep_rows=1):
+        self.columns = columns
+        self.track_text = track_text
+        self.expected_text = expected_text
+        self.keep_rows = keep_rows
+        self.row_count = 0
+        self.first_rows = []
+        self.bytes = 0
+        self.text_digest = hashlib.sha1()
+        self.text_length = 0
+        self.preview = ""
+        self.mismatch_offset = None  # first differing character vs expected_text
+        self.complete = False
+        self.feed_text("[")
+
+    @classmethod
+    def from_rows(cls, rows, columns=None):
+        outcome = cls(columns or [])
+        for row in rows:
+            outcome.add_row(row)
+        outcome.finish()
+        return outcome
+
+    def feed_text(self, piece):
+        if not self.track_text:
+            return
+        if self.expected_text is not None and self.mismatch_offset is None:
+            expected_piece = self.expected_text[self.text_length:self.text_length + len(piece)]
+            if expected_piece != piece:
+                common = 0
+                while common < len(expected_piece) and expected_piece[common] == piece[common]:
+                    common += 1
+                self.mismatch_offset = self.text_length + common
+        self.text_digest.update(piece.encode("utf-8", "surrogatepass"))
+        self.text_length += len(piece)
+        if len(self.preview) < MAX_RESULT_TEXT:
+            self.preview += piece[:MAX_RESULT_TEXT - len(self.preview)]
+
+    def add_row(self, row):
+        self.row_count += 1
+        if len(self.first_rows) < self.keep_rows:
+            self.first_rows.append(row)
+        self.bytes += estimate_result_bytes((row,))
+        self.feed_text((", " if self.row_count > 1 else "") + repr(row))
+
+    def can_stop_early(self):
+        # Once the text differs and the result cannot be a single value, nothing else is needed
+        could_be_scalar = self.row_count <= 1 and (not self.first_rows or len(self.first_rows[0]) == 1)
+        return self.mismatch_offset is not None and not could_be_scalar
+
+    def finish(self):
+        self.feed_text("]")
+        if self.expected_text is not None and self.mismatch_offset is None and self.text_length < len(self.expected_text):
+            self.mismatch_offset = self.text_length
+        self.complete = True
+
+    def text_matches(self, expected_text):
+        if self.expected_text == expected_text and self.complete:
+            return self.mismatch_offset is None
+        return (self.text_length == len(expected_text)
+                and self.text_digest.hexdigest() == hashlib.sha1(expected_text.encode("utf-8", "surrogatepass")).hexdigest())
+
+    def text_summary(self):
+        if self.complete and self.text_length <= MAX_RESULT_TEXT:
+            return self.preview
+        if self.complete:
+            size = f"{self.row_count} rows, {self.text_length:,} characters"
+        else:
+            size = f"stopped after {self.row_count} rows, {self.text_length:,} characters"
+        return f"{self.preview}... [{size}, {self.bytes:,} bytes]"
+
+
+def stream_query(cursor, expected_result=None, keep_rows=1, governor=None):
+    """Fetch cursor's rows in batches into a QueryOutcome, stopping at the first text difference."""
+    kind = expectation_kind(expected_result) if expected_result is not None else "value"
+    columns = [desc[0] for desc in cursor.description] if cursor.description else []
+    # Text is only needed when the expectation may compare the whole result set
+    outcome = QueryOutcome(columns, track_text=(kind == "value"),
+                           expected_text=expected_result if kind == "value" else None, keep_rows=max(1, keep_rows))
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH_ROWS)
+        if not rows:
+            break
+        for row in rows:
+            outcome.add_row(row)
+        if governor is not None:
+            governor.check_fetch(outcome.row_count, outcome.bytes)
+        # A short batch means the cursor is exhausted, so the result is finished in full instead
+        if len(rows) == FETCH_BATCH_ROWS and outcome.can_stop_early():
+            return outcome
+    outcome.finish()
+    return outcome
+
+
+class ResourceLimitError(Exception):
+    def __init__(self, message, row_count, byte_count):
+        super().__init__(message)
+        self.row_count = row_count
+        self.byte_count = byte_count
+
+
+def sqlite_memory_counter():
+    """sqlite3_memory_used() of the SQLite library behind the sqlite3 module, or None when it cannot be reached."""
+    try:
+        import _sqlite3
+    except ImportError:
+        return None
+    # Linux/macOS resolve it through the extension module; Windows ships it as a separate sqlite3.dll
+    for library in (_sqlite3.__file__, os.path.join(os.path.dirname(_sqlite3.__file__), "sqlite3.dll")):
+        try:
+            memory_used = ctypes.CDLL(library).sqlite3_memory_used
+        except (OSError, AttributeError):
+            continue
+        memory_used.restype = ctypes.c_int64
+        return memory_used
+    return None
+
+
+SQLITE_MEMORY_USED = sqlite_memory_counter()
+
+
+def in_memory_bytes(db_conn):
+    total = 0
+    for _, name, file_name in db_conn.execute("PRAGMA database_list").fetchall():
+        if not file_name:
+            quoted = '"' + name.replace('"', '""') + '"'
+            page_count = db_conn.execute(f"PRAGMA {quoted}.page_count").fetchone()[0]
+            total += page_count * db_conn.execute(f"PRAGMA {quoted}.page_size").fetchone()[0]
+    return total
+
+
+class ResourceGovernor:
+    """Per-query fetch caps, plus SQLite memory and TEMP-store limits, for a run or a manual query."""
+
+    # Heap limits are process-wide: one governor holds the memory cap at a time, one per connection the TEMP cap.
+    # The hard heap limit is not used since it can only ever be lowered for the whole process.
+    holders = {}
+    holders_lock = threading.Lock()
+
+    def __init__(self, options):
+        self.max_rows = int(options.get("max_fetch_rows") or 0)
+        self.max_bytes = int(float(options.get("max_fetch_mb") or 0) * MB)
+        self.heap_headroom = int(float(options.get("sqlite_heap_mb") or 0) * MB)
+        self.temp_growth = int(float(options.get("temp_store_mb") or 0) * MB)
+        self.db_conn = None
+        self.held = {}  # holder key -> value to restore
+        self.heap_limit = 0
+        self.heap_exceeded = False
+
+    def check_fetch(self, row_count, byte_count):
+        if self.max_rows and row_count > self.max_rows:
+            raise ResourceLimitError(
+                f"Row cap: the query returned more than {self.max_rows:,} rows (max_fetch_rows); fetching stopped.",
+                row_count, byte_count)
+        if self.max_bytes and byte_count > self.max_bytes:
+            raise ResourceLimitError(
+                f"Byte cap: the query returned more than {self.max_bytes / MB:g} MB (max_fetch_mb, "
+                f"{byte_count:,} bytes fetched); fetching stopped.", row_count, byte_count)
+
+    def fetch_rows(self, cursor):
+        rows = []
+        byte_count = 0
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_ROWS)
+            if not batch:
+                return rows, None
+            for row in batch:
+                byte_count += estimate_result_bytes((row,))
+                try:
+                    self.check_fetch(len(rows) + 1, byte_count)
+                except ResourceLimitError as e:
+                    return rows, str(e)
+                rows.append(row)
+
+    def claim(self, key, current):
+        with ResourceGovernor.holders_lock:
+            if ResourceGovernor.holders.get(key, self) is not self:
+                return False
+            ResourceGovernor.holders[key] = self
+            self.held.setdefault(key, current)
+            return True
+
+    def apply(self, db_conn):
+        self.db_conn = db_conn
+        if self.heap_headroom and self.claim("heap", db_conn.execute("PRAGMA soft_heap_limit").fetchone()[0]):
+            held = SQLITE_MEMORY_USED() if SQLITE_MEMORY_USED is not None else in_memory_bytes(db_conn)
+            self.heap_limit = held + self.heap_headroom
+            db_conn.execute(f"PRAGMA soft_heap_limit = {self.heap_limit}")
+        temp_key = ("temp", id(db_conn))
+        if self.temp_growth and self.claim(temp_key, db_conn.execute("PRAGMA temp.max_page_count").fetchone()[0]):
+            page_size = db_conn.execute("PRAGMA temp.page_size").fetchone()[0]
+            page_count = db_conn.execute("PRAGMA temp.page_count").fetchone()[0]
+            db_conn.execute(f"PRAGMA temp.max_page_count = {page_count + max(1, self.temp_growth // page_size)}")
+
+    def release(self):
+        with ResourceGovernor.holders_lock:
+            for key, previous in self.held.items():
+                if key == "heap":
+                    self.db_conn.execute(f"PRAGMA soft_heap_limit = {previous}")
+                else:
+                    self.db_conn.execute(f"PRAGMA temp.max_page_count = {previous}")
+                del ResourceGovernor.holders[key]
+            self.held = {}
+
+    @contextlib.contextmanager
+    def lifted(self):
+        """Lift the SQLite limits while data is loaded or fixtures are built; they are measured again afterwards."""
+        active = bool(self.held)
+        self.release()
+        try:
+            yield
+        finally:
+            if active:
+                self.apply(self.db_conn)
+
+    def over_heap(self):
+        if "heap" in self.held and SQLITE_MEMORY_USED is not None and SQLITE_MEMORY_USED() > self.heap_limit:
+            self.heap_exceeded = True
+        return self.heap_exceeded
+
+    def memory_message(self):
+        return (f"Memory cap: SQLite needed more than the {self.heap_headroom / MB:g} MB allowed on top of what it "
+                f"already held, e.g. the loaded data (sqlite_heap_mb, {self.heap_limit:,} bytes in all); "
+                f"the statement was stopped.")
+
+    def violation(self, error):
+        if isinstance(error, ResourceLimitError):
+            return str(error)
+        if self.heap_exceeded or (isinstance(error, MemoryError) and "heap" in self.held):
+            return self.memory_message()
+        if (isinstance(error, sqlite3.OperationalError) and "database or disk is full" in str(error)
+                and ("temp", id(self.db_conn)) in self.held):
+            return (f"Temp store cap: TEMP tables and indexes may grow by {self.temp_growth / MB:g} MB "
+                    f"(temp_store_mb), or the disk is full; the statement was stopped.")
+        return None
+
+
+def parse_diff_expectation(expected_result):
+    """Return (source_sql, key_columns) for a "MATCHES <table or query> [KEY col, ...]" expectation."""
+    match = _DIFF_EXPECTATION_RE.match(expected_result)
+    source, keys = match.group(1).strip(), match.group(2)
+    if source.startswith("(") and source.endswith(")"):
+        source = source[1:-1].strip()
+    if not re.match(r"(?i)(select|with|values)\b", source):
+        source = f'SELECT * FROM "{source.strip(chr(34))}"'
+    key_columns = [key.strip().strip('"') for key in keys.split(",") if key.strip()] if keys else []
+    return source.rstrip("; \n\t"), key_columns
+
+
+def diff_query(actual_sql, expected_sql, columns, key_positions):
+    """Build one SQL statement listing only the groups of rows that differ between two results."""
+    names = [f"c{position}" for position in range(len(columns))]
+    column_list = ", ".join(names)
+    row_text = " || ', ' || ".join(f"quote({name})" for name in names)
+    group_names = [names[position] for position in key_positions] or names
+    group_list = ", ".join(group_names)
+    key_text = " || ', ' || ".join(f"quote({name})" for name in group_names)
+    # A group differs when some distinct row occurs a different number of times on each side, so identical
+    # duplicates under one key are not a difference
+    return (
+        f"WITH actual({column_list}) AS ({actual_sql}), expected({column_list}) AS ({expected_sql}), "
+        f"tagged AS (SELECT *, {row_text} AS row_text FROM "
+        f"(SELECT *, 1 AS side FROM actual UNION ALL SELECT *, 2 AS side FROM expected)), "
+        f"counted AS (SELECT {group_list}, row_text, SUM(side = 1) AS in_actual, SUM(side = 2) AS in_expected "
+        f"FROM tagged GROUP BY {group_list}, row_text) "
+        f"SELECT SUM(MAX(in_actual - in_expected, 0)) AS only_actual, "
+        f"SUM(MAX(in_expected - in_actual, 0)) AS only_expected, "
+        f"MIN(CASE WHEN in_actual > in_expected THEN row_text END), "
+        f"MIN(CASE WHEN in_expected > in_actual THEN row_text END), {key_text} "
+        f"FROM counted GROUP BY {group_list} HAVING only_actual + only_expected > 0"
+    )
+
+
+class ResultFingerprint:
+    """Order-insensitive fingerprint of a result set: the sum of per-row hashes plus the row count."""
+
+    def __init__(self):
+        self.row_count = 0
+        self.total = 0
+
+    def add(self, row):
+        self.row_count += 1
+        row_hash = hashlib.sha1(json.dumps(list(row), default=str).encode()).digest()
+        self.total = (self.total + int.from_bytes(row_hash[:8], "big")) % (1 << 64)
+
+    def hexdigest(self):
+        return f"{self.row_count:x}-{self.total:016x}"
+
+
+def golden_snapshot_path(tc_name, suite="", directory=GOLDEN_DIR):
+    if suite:
+        # Suites may reuse test names, so each gets its own folder
+        directory = os.path.join(directory, "".join(c if c.isalnum() or c in "._-" else "_" for c in suite))
+    safe_name = "".join(c if c.isalnum() or c in "._-" else "_" for c in str(tc_name))[:80]
+    # The hash keeps names that sanitize alike apart
+    return os.path.join(directory, f"{safe_name}-{hashlib.sha1(str(tc_name).encode()).hexdigest()[:8]}.jsonl")
+
+
+def write_golden_snapshot(path, columns, fingerprint):
+    header = {"columns": columns, "rows": fingerprint.row_count, "fingerprint": fingerprint.hexdigest()}
+    with open(path + ".new", "w", encoding="utf-8") as snapshot, open(path + ".tmp", encoding="utf-8") as rows:
+        snapshot.write(json.dumps(header) + "\n")
+        for line in rows:
+            snapshot.write(line)
+    os.replace(path + ".new", path)
+    os.remove(path + ".tmp")
+
+
+def read_golden_header(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as snapshot:
+        return json.loads(snapshot.readline())
+
+
+def read_golden_rows(path, batch_size=FETCH_BATCH_ROWS):
+    with open(path, encoding="utf-8") as snapshot:
+        snapshot.readline()
+        batch = []
+        for line in snapshot:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def evaluate_sql_expectation(expected_result, outcome):
+    status = "FAIL"
+    actual_result_str = outcome.text_summary() if outcome.track_text else ""
+    error_details = ""
+    row_count = outcome.row_count
+    kind = expectation_kind(expected_result)
+    if kind == "zero_rows":
+        if not row_count:
+            status = "PASS"
+            actual_result_str = "[]"
+        else:
+            actual_result_str = f"{row_count} rows found."
+    elif kind == "count":
+        expected_count = int(expected_result.split("=")[1].strip())
+        actual_result_str = f"COUNT = {row_count}"
+        if row_count == expected_count:
+            status = "PASS"
+    elif kind == "no_records":
+        if not row_count:
+            status = "PASS"
+            actual_result_str = "[]"
+        else:
+            actual_result_str = f"{row_count} records found."
+    elif kind == "records_exist":
+        if row_count:
+            status = "PASS"
+            actual_result_str = f"{row_count} records exist."
+        else:
+            actual_result_str = "No records found."
+    elif outcome.complete and row_count == 1 and len(outcome.first_rows[0]) == 1:
+        actual_result_str = str(outcome.first_rows[0][0])
+        if actual_result_str.strip() == expected_result:
+            status = "PASS"
+    else:
+        if outcome.complete and outcome.text_matches(expected_result):
+            status = "PASS"
+        else:
+            where = (f" at character {outcome.mismatch_offset}"
+                     if outcome.expected_text == expected_result and outcome.mismatch_offset is not None else "")
+            error_details = (f"Generic comparison failed{where}. Actual: '{actual_result_str}', "
+                             f"Expected: '{bounded_text(expected_result)}'")
+    return status, actual_result_str, error_details
 
 class SQLWorker(QThread):
     result_ready = pyqtSignal(object, object)  # (rows, columns)
@@ -41,8 +1322,1395 @@ class SQLWorker(QThread):
         except Exception as e:
             self.error.emit(str(e))
 
+class ResultCache:
+    def __init__(self, path=STATE_DB_PATH, log=print):
+        # One instance (and connection) is shared by the threads of a matrix run, so writes never wait on each other
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.log = log
+        self.write_errors = 0
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache (cache_key TEXT PRIMARY KEY, result TEXT, stored_at REAL)"
+        )
+        self.pending_writes = 0
+
+    def get(self, cache_key):
+        with self.lock:
+            row = self.conn.execute("SELECT result FROM result_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, cache_key, result):
+        # A cache that cannot be written (e.g. locked by another process) only costs a re-run later
+        with self.lock:
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO result_cache VALUES (?, ?, ?)",
+                    (cache_key, json.dumps(result, default=str), time.time())
+                )
+                self.pending_writes += 1
+                if self.pending_writes >= 200:
+                    self.commit()
+            except sqlite3.Error as e:
+                self.write_failed(e)
+
+    def commit(self):
+        self.conn.commit()
+        self.pending_writes = 0
+
+    def write_failed(self, error):
+        self.pending_writes = 0
+        try:
+            self.conn.rollback()
+        except sqlite3.Error:
+            pass
+        if self.log and not self.write_errors:
+            self.log(f"Result cache not updated: {error}")
+        self.write_errors += 1
+
+    def flush(self):
+        with self.lock:
+            try:
+                self.commit()
+            except sqlite3.Error as e:
+                self.write_failed(e)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+class RunHistory:
+    def __init__(self, path=STATE_DB_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS run_history (test_key TEXT PRIMARY KEY, last_status TEXT, "
+            "last_duration REAL, runs INTEGER, failures INTEGER, last_run REAL)"
+        )
+        # Full results of the last run of each test definition, for changed-only runs
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS last_results (definition_key TEXT PRIMARY KEY, data_key TEXT, result TEXT, "
+            "recorded_at REAL)"
+        )
+
+    def lookup(self, test_cases):
+        rows = self.conn.execute("SELECT test_key, last_status, last_duration, runs, failures FROM run_history")
+        known = {row[0]: {"status": row[1], "duration": row[2], "runs": row[3], "failures": row[4]} for row in rows}
+        return [known.get(test_case_key(tc)) for tc in test_cases]
+
+    def record(self, test_case_results):
+        now = time.time()
+        for tc, result in test_case_results:
+            if result["Status"] in ("SKIPPED", "CANCELLED"):
+                continue
+            failed = 1 if result["Status"] in FAILURE_STATUSES else 0
+            # Reused results say nothing about how long the query takes
+            duration = result["Duration (s)"] if result.get("Source") == "executed" else None
+            self.conn.execute(
+                "INSERT INTO run_history VALUES (?, ?, ?, 1, ?, ?) ON CONFLICT(test_key) DO UPDATE SET "
+                "last_status = excluded.last_status, last_duration = COALESCE(excluded.last_duration, last_duration), "
+                "runs = runs + 1, failures = failures + excluded.failures, last_run = excluded.last_run",
+                (test_case_key(tc), result["Status"], duration, failed, now)
+            )
+        self.conn.commit()
+
+    def previous_results(self, definition_keys, data_key):
+        rows = self.conn.execute("SELECT definition_key, result FROM last_results WHERE data_key = ?", (data_key,))
+        return {key: json.loads(result) for key, result in rows if key in definition_keys}
+
+    def store_results(self, entries):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO last_results VALUES (?, ?, ?, ?)",
+            [(definition_key, data_key, json.dumps(result, default=str), now)
+             for definition_key, data_key, result in entries]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+class RunJournal:
+    """Results of the run in progress, committed as each test finishes so a crashed run can resume."""
+
+    def __init__(self, path=JOURNAL_DB_PATH):
+        self.conn = sqlite3.connect(path, timeout=30)
+        # One fsync per result would dominate short tests; NORMAL still survives a process crash
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS run_journal (run_key TEXT, position INTEGER, result TEXT, recorded_at REAL, "
+            "PRIMARY KEY (run_key, position))"
+        )
+
+    def load(self, run_key):
+        rows = self.conn.execute("SELECT position, result FROM run_journal WHERE run_key = ?", (run_key,))
+        return {position: json.loads(result) for position, result in rows}
+
+    def start(self, run_key):
+        """Begin a fresh journal for run_key, dropping journals abandoned more than JOURNAL_RETENTION_DAYS ago."""
+        self.conn.execute("DELETE FROM run_journal WHERE run_key = ? OR recorded_at < ?",
+                          (run_key, time.time() - JOURNAL_RETENTION_DAYS * 86400))
+        self.conn.commit()
+
+    def record(self, run_key, position, result):
+        self.conn.execute("INSERT OR REPLACE INTO run_journal VALUES (?, ?, ?, ?)",
+                          (run_key, position, json.dumps(result, default=str), time.time()))
+        self.conn.commit()
+
+    def finish(self, run_key):
+        self.conn.execute("DELETE FROM run_journal WHERE run_key = ?", (run_key,))
+        self.conn.commit()
+
+    def latest(self):
+        row = self.conn.execute("SELECT run_key FROM run_journal ORDER BY recorded_at DESC LIMIT 1").fetchone()
+        if row is None:
+            return []
+        results = self.load(row[0])
+        return [results[position] for position in sorted(results)]
+
+    def close(self):
+        self.conn.close()
+
+class TimeBudget:
+    """Picks the tests that fit a wall-clock budget, and drops planned ones when the run falls behind."""
+
+    def __init__(self, test_cases, history_rows, seconds, started, not_run=None):
+        self.deadline = started + seconds
+        known = sorted(row["duration"] for row in history_rows if row and row["duration"] is not None)
+        self.rows = []
+        for tc, past in zip(test_cases, history_rows):
+            self.rows.append({
+                "priority": tc.get("Priority", DEFAULT_PRIORITY),
+                "last": "new" if past is None else past["status"],
+                "tier": 1 if past is None else 0 if past["status"] in FAILURE_STATUSES else 2,
+                "predicted": past["duration"] if past and past["duration"] is not None else None,
+            })
+        ranked = sorted(range(len(test_cases)), key=lambda position: (
+            self.rows[position]["priority"], self.rows[position]["tier"], self.rows[position]["predicted"] or 0.0,
+            position))
+        self.rank = {position: rank for rank, position in enumerate(ranked, start=1)}
+        # Tests without a recorded duration are planned at the median one (or free, with no history at all)
+        typical = known[len(known) // 2] if known else 0.0
+        # Tests known not to execute (e.g. failed pre-flight) reserve nothing
+        self.reasons = {position: f"not executed: {reason}" for position, reason in (not_run or {}).items()}
+        self.planned = []
+        self.unselected = set()
+        # Setting up the run counts against the budget, so plan with what is left of it
+        left = max(0.0, self.deadline - time.monotonic())
+        for position in ranked:
+            if position in self.reasons:
+                continue
+            cost = self.rows[position]["predicted"]
+            cost = typical if cost is None else cost
+            if cost <= left:
+                self.planned.append(position)
+                left -= cost
+            else:
+                self.unselected.add(position)
+                self.reasons[position] = (f"not selected: predicted {cost:.3g}s, but only {left:.3g}s of the "
+                                          f"{seconds:g}s budget was left after setup and higher-ranked tests")
+        self.open = set(self.planned)
+        self.known_cost = sum(self.rows[position]["predicted"] for position in self.open
+                              if self.rows[position]["predicted"] is not None)
+        self.unknown_count = sum(1 for position in self.open if self.rows[position]["predicted"] is None)
+        self.typical = typical
+        self.predicted_done = self.actual_done = 0.0
+        self.unknown_done = []
+        self.actual = {}
+        self.admitted = set()
+
+    def slowdown(self):
+        return self.actual_done / self.predicted_done if self.predicted_done > 0 else 1.0
+
+    def close(self, position):
+        self.open.discard(position)
+        if self.rows[position]["predicted"] is None:
+            self.unknown_count -= 1
+        else:
+            self.known_cost -= self.rows[position]["predicted"]
+
+    def admit(self, position, now):
+        """Return None when the test should run now, otherwise why it is skipped."""
+        left = self.deadline - now
+        factor = self.slowdown()
+        per_unknown = sum(self.unknown_done) / len(self.unknown_done) if self.unknown_done else self.typical
+        committed = self.known_cost * factor + self.unknown_count * per_unknown
+        if position in self.unselected and left > 0:
+            predicted = self.rows[position]["predicted"]
+            if committed + (per_unknown if predicted is None else predicted * factor) <= left:
+                # Time given back by faster tests, or by tests that did not execute, makes room for it after all
+                self.unselected.discard(position)
+                del self.reasons[position]
+                self.admitted.add(position)
+                return None
+        if position not in self.open:
+            return self.reasons[position]
+        if left <= 0:
+            self.close(position)
+            self.reasons[position] = "the budget was used up before this test started"
+            return self.reasons[position]
+        if committed > left:
+            # Plan the rest again, in rank order, with the pace seen so far
+            kept = []
+            for planned in self.planned:
+                if planned not in self.open:
+                    continue
+                predicted = self.rows[planned]["predicted"]
+                cost = per_unknown if predicted is None else predicted * factor
+                if cost <= left:
+                    kept.append(planned)
+                    left -= cost
+                else:
+                    self.close(planned)
+                    self.reasons[planned] = (f"dropped during the run: expected to take {cost:.3g}s (tests ran at "
+                                             f"{factor:.2f}x their predicted time), but only {left:.3g}s was left")
+            self.planned = kept
+            if position not in self.open:
+                return self.reasons[position]
+        self.close(position)
+        self.admitted.add(position)
+        return None
+
+    def release(self, position, reason):
+        """Give back the share of a test that ends without executing (pre-flight error, abort, ...)."""
+        self.close(position)
+        self.reasons[position] = reason
+
+    def record(self, position, duration):
+        self.actual[position] = duration
+        if self.rows[position]["predicted"] is None:
+            self.unknown_done.append(duration)
+        else:
+            self.predicted_done += self.rows[position]["predicted"]
+            self.actual_done += duration
+
+    def report(self, test_cases):
+        rows = []
+        for position in sorted(self.rank, key=self.rank.get):
+            row = self.rows[position]
+            rows.append({
+                "Rank": self.rank[position],
+                "TC Name": test_cases[position]['TC_Name'],
+                "Priority": row["priority"],
+                "Last Status": row["last"],
+                "Predicted (s)": "" if row["predicted"] is None else round(row["predicted"], 4),
+                "Actual (s)": round(self.actual[position], 4) if position in self.actual else "",
+                "Decision": "skipped" if position in self.reasons else "run" if position in self.admitted
+                else "not reached",
+                "Reason": self.reasons.get(position, ""),
+            })
+        return rows
+
+class ValidationEngine:
+    """Runs prepared test cases against a SQLite connection without touching the UI."""
+
+    def __init__(self, db_conn, validation_lib=None, result_cache=None, table_fingerprints=None, options=None,
+                 history=None, fixtures=None, journal=None, loader=None, fingerprints_state=None):
+        self.db_conn = db_conn
+        # With a PipelinedLoader, data is still being loaded while the tests run
+        self.loader = loader
+        self.fixtures = fixtures or []
+        self.journal = journal
+        self.journal_key = None
+        self.run_data_key = None
+        self.fixtures_stale = True
+        self.validation_lib = validation_lib
+        self.result_cache = result_cache
+        self.history = history
+        self.options = dict(DEFAULT_RUN_OPTIONS, **(options or {}))
+        self.governor = ResourceGovernor(self.options)
+        # Limits enforced from SQLite's progress handler while a test runs
+        self.should_stop = None
+        self.on_tick = None
+        self.last_tick = 0.0
+        self.run_deadline = None
+        self.test_deadline = None
+        self.interrupt_reason = None
+        # Fingerprints recorded when the data was loaded; scanned ones are computed lazily. Both describe the
+        # data as of fingerprints_state (db_state) and are dropped as soon as the database moves on from it.
+        self.known_fingerprints = dict(table_fingerprints or {})
+        self.fingerprint_cache = {}
+        self.fingerprints_state = db_state(db_conn) if db_conn else None
+        if fingerprints_state is not None and fingerprints_state != self.fingerprints_state:
+            self.known_fingerprints.clear()
+        self.isolation_state = None
+        # Per-run result cache: normalized SQL -> fetched rows
+        self.query_cache = {}
+        self.stats = {"executions": 0, "executions_saved": 0, "cache_hits": 0, "indexes_created": 0, "fused_tests": 0,
+                      "isolated_tests": 0, "resumed": 0, "carried_forward": 0,
+                      "load_wait": 0.0, "budget_skipped": 0}
+        # Additional report sheets produced during the run: sheet name -> rows
+        self.extra_reports = {}
+        self.rows_fetched = 0
+        self.bytes_fetched = 0
+        self.result_source = "executed"
+        self.failing_rows = None
+        self.aborted = False
+        self.isolating = False
+        self.sampled_tables = []
+        if self.options["sample_mode"] != "off":
+            # Sampled outcomes must never be mistaken for full-data ones
+            self.result_cache = None
+            self.history = None
+
+    def invalidate_cache(self):
+        self.query_cache.clear()
+        # A fixture's sources may have changed; it is checked again before the next test
+        self.fixtures_stale = True
+        self.forget_fingerprints()
+
+    def forget_fingerprints(self):
+        # Fingerprints taken before the change no longer describe the data
+        self.known_fingerprints.clear()
+        self.fingerprint_cache.clear()
+        self.fingerprints_state = db_state(self.db_conn)
+
+    @contextlib.contextmanager
+    def keeping_fingerprints(self):
+        """For changes that leave the tables' data as it was: fixtures, indexes, newly loaded tables."""
+        valid = db_state(self.db_conn) == self.fingerprints_state
+        try:
+            yield
+        finally:
+            if valid:
+                self.fingerprints_state = db_state(self.db_conn)
+
+    def current_fingerprints(self):
+        """(fingerprints of the tables that still describe their data, the db_state they describe)."""
+        if db_state(self.db_conn) != self.fingerprints_state:
+            self.forget_fingerprints()
+        tables = set(user_tables(self.db_conn))
+        known = dict(self.fingerprint_cache, **self.known_fingerprints)
+        return {table: fingerprint for table, fingerprint in known.items() if table in tables}, self.fingerprints_state
+
+    def fingerprint(self, table_name):
+        if db_state(self.db_conn) != self.fingerprints_state:
+            # Changed behind the engine's back, e.g. by a statement that wrote and then failed
+            self.forget_fingerprints()
+        if table_name in self.known_fingerprints:
+            return self.known_fingerprints[table_name]
+        if table_name not in self.fingerprint_cache:
+            self.fingerprint_cache[table_name] = table_fingerprint(self.db_conn, table_name)
+        return self.fingerprint_cache[table_name]
+
+    def dependencies(self, tc):
+        if tc['Call Type'] == "SQL" and self.db_conn:
+            tables_read, writes = analyze_sql(self.db_conn, tc['SQL/Keyword'], tc.get("Parameters") or ())
+            if expectation_kind(tc['Expected_Result']) == "diff":
+                # The other side of the diff is read too
+                source_tables, source_writes = analyze_sql(self.db_conn, parse_diff_expectation(tc['Expected_Result'])[0])
+                return tables_read | source_tables, writes or source_writes
+            return tables_read, writes
+        if tc['Call Type'] == "KEYWORD":
+            # A keyword receives the connection and may read any table
+            return {ALL_TABLES}, False
+        return set(), False
+
+    def persistent_cache_key(self, tc, tables_read, writes):
+        """Key for the on-disk cache, or None when the outcome must not be reused."""
+        if self.result_cache is None or not self.db_conn or writes or "Parameter Error" in tc:
+            return None
+        if tc['Call Type'] == "SQL":
+            if not tables_read:
+                # Nothing it reads has a fingerprint, so nothing would ever invalidate the outcome
+                return None
+            if volatile_sql(self.db_conn, tc['SQL/Keyword'], tc.get("Parameters") or ()):
+                return None
+            if (expectation_kind(tc['Expected_Result']) == "diff"
+                    and volatile_sql(self.db_conn, parse_diff_expectation(tc['Expected_Result'])[0])):
+                return None
+            code = normalize_sql(tc['SQL/Keyword'])
+            extra = None
+            if expectation_kind(tc['Expected_Result']) == "golden":
+                if self.options["update_golden"]:
+                    return None
+                # A re-baselined snapshot must not be answered from an old outcome
+                header = read_golden_header(golden_snapshot_path(tc['TC_Name'], tc.get("Suite", "")))
+                extra = header["fingerprint"] if header else None
+        elif tc['Call Type'] == "KEYWORD" and self.validation_lib is not None:
+            # Keywords depend on every table and on their own source
+            code = tc['SQL/Keyword']
+            tables_read = user_tables(self.db_conn)
+            extra = self.library_digest()
+        else:
+            return None
+        try:
+            fingerprints = sorted((table, self.fingerprint(table)) for table in tables_read)
+        except sqlite3.Error:
+            return None
+        # Both options change what an outcome records (diff counts, the rows kept for the report)
+        key_parts = [RESULT_CACHE_VERSION, tc['Call Type'], code, tc['Expected_Result'], fingerprints, extra,
+                     self.options["diff_limit"], self.options["failing_rows"]]
+        if tc.get("Parameters"):
+            key_parts.append(tc["Parameters"])
+        return hashlib.sha1(json.dumps(key_parts, default=str).encode()).hexdigest()
+
+    def fetch_query_outcome(self, sql, expected_result, params=()):
+        cache_key = normalize_sql(sql)
+        if params:
+            cache_key += "\x00" + json.dumps(params, default=str, sort_keys=True)
+        cached = self.query_cache.get(cache_key)
+        # An outcome streamed for a count has no text to compare a value against
+        if cached is not None and (cached.track_text or expectation_kind(expected_result) != "value"):
+            self.stats["executions_saved"] += 1
+            self.result_source = "shared"
+            return cached
+        state_before = db_state(self.db_conn)
+        cursor = self.db_conn.cursor()
+        # The same template text reuses one prepared statement from the connection's statement cache
+        cursor.execute(sql, params)
+        try:
+            outcome = stream_query(cursor, expected_result, self.options["failing_rows"], self.governor)
+        finally:
+            cursor.close()
+        self.stats["executions"] += 1
+        self.rows_fetched += outcome.row_count
+        self.bytes_fetched += outcome.bytes
+        if self.isolating:
+            pass  # the test's changes are rolled back, and its outcome is never shared
+        elif db_state(self.db_conn) != state_before:
+            # The test changed the database, so nothing cached so far can be trusted
+            self.invalidate_cache()
+        elif outcome.complete:
+            self.query_cache[cache_key] = outcome
+        return outcome
+
+    def run(self, test_cases, on_progress=None, should_stop=None, on_tick=None):
+        """Run test cases and return their results in the listed order."""
+        run_started = time.monotonic()
+        if self.loader:
+            # The tables do not exist yet; the files they come from identify the data
+            self.run_data_key = self.loader.files_digest
+        else:
+            self.run_data_key = self.data_key() if self.db_conn and (self.journal or self.history) else None
+        resumed = self.resume(test_cases)
+        carried = self.carry_forward(test_cases, resumed) if self.options["changed_only"] else {}
+        listed_test_cases = test_cases
+        # Positions below are into the tests still to run; listed_positions maps them back
+        listed_positions = [position for position in range(len(test_cases))
+                            if position not in resumed and position not in carried]
+        test_cases = [listed_test_cases[position] for position in listed_positions]
+        self.should_stop = should_stop
+        self.on_tick = on_tick
+        if self.options["run_timeout"]:
+            self.run_deadline = time.monotonic() + self.options["run_timeout"]
+        results_by_position = {}
+        failures = 0
+        preflight_errors = {}
+        needs = []
+        if self.loader:
+            fixture_names = [fixture["Fixture"] for fixture in self.fixtures]
+            needs = [self.loader.tables_needed(tc, fixture_names) for tc in test_cases]
+            self.loader.plan(needs)
+            self.loader.start()
+        fusion_offered = set()
+        budget = None
+        try:
+            if self.loader and (self.options["sample_mode"] != "off" or self.options["index_advisor"] != "off"):
+                # Both work on all the data before the first test
+                self.wait_for_tables(self.loader.sheets, should_stop)
+            if self.options["preflight"] != "off" and self.db_conn:
+                self.extra_reports["Pre-flight"], preflight_errors = self.preflight(test_cases)
+            self.aborted = self.options["preflight"] == "abort" and bool(preflight_errors)
+            if self.options["sample_mode"] != "off" and self.db_conn and not self.aborted:
+                self.extra_reports["Sampling"] = self.build_sample_tables()
+            if self.fixtures and self.db_conn and not self.aborted and not self.loading():
+                self.extra_reports["Fixtures"] = self.build_fixtures()
+            if self.options["index_advisor"] != "off" and self.db_conn and not self.aborted:
+                self.extra_reports["Index Advisor"] = self.run_index_advisor(test_cases)
+            if self.options["fuse_aggregates"] and self.db_conn and not self.aborted and not self.loader:
+                self.extra_reports["Fused Scans"] = self.fuse_aggregate_tests(test_cases)
+            order = self.pipeline_schedule(test_cases, needs) if self.loader else self.schedule(test_cases)
+            if self.options["time_budget"]:
+                # Setting up the run counts against the budget too
+                history_rows = self.history.lookup(test_cases) if self.history is not None else [None] * len(test_cases)
+                not_run = ({position: f"pre-flight {problem}" for position, (problem, _) in preflight_errors.items()}
+                           if self.options["preflight"] in ("error", "abort") else {})
+                budget = TimeBudget(test_cases, history_rows, self.options["time_budget"], run_started, not_run)
+                if not self.loader:
+                    order = self.budget_order(test_cases, order, budget)
+            if self.db_conn:
+                # Measured after the setup above, which may add sample and fixture tables
+                self.governor.apply(self.db_conn)
+            for done, position in enumerate(order):
+                tc = test_cases[position]
+                if should_stop and should_stop():
+                    break
+                if self.loading() and not self.aborted:
+                    if self.wait_for_tables(needs[position], should_stop) and self.options["fuse_aggregates"]:
+                        # Fuse the tests the new tables made ready, before the first of them runs
+                        ready = [later for later in order[done:] if later not in fusion_offered
+                                 and needs[later] <= set(self.loader.loaded)]
+                        fusion_offered.update(ready)
+                        self.extra_reports.setdefault("Fused Scans", []).extend(
+                            self.fuse_aggregate_tests([test_cases[later] for later in ready]))
+                if self.fixtures_stale and self.fixtures and self.db_conn and not self.aborted and not self.loading():
+                    # A test changed the data (or the data finished loading): rebuild the fixtures whose sources differ
+                    with self.governor.lifted():
+                        self.extra_reports.setdefault("Fixtures", []).extend(self.build_fixtures())
+                if position in preflight_errors and self.options["preflight"] in ("error", "abort"):
+                    result = self.preflight_result(tc, preflight_errors[position])
+                elif self.aborted:
+                    result = self.skipped_result(
+                        tc, f"Run aborted: pre-flight found {len(preflight_errors)} test(s) whose SQL cannot be prepared."
+                    )
+                elif self.run_deadline and time.monotonic() > self.run_deadline:
+                    result = self.skipped_result(tc, "Run time limit reached before this test started.")
+                elif self.options["max_failures"] and failures >= self.options["max_failures"]:
+                    result = self.skipped_result(tc, f"Run stopped after {failures} failing test(s).")
+                elif budget is not None and budget.admit(position, time.monotonic()) is not None:
+                    result = self.skipped_result(tc, f"Time budget: {budget.reasons[position]}.")
+                    self.stats["budget_skipped"] += 1
+                else:
+                    result = self.run_test_case(tc)
+                    if self.loading() and result["Status"] == "ERROR" and "no such table" in result["Error/Details"]:
+                        # Its SQL reads a table the text scan missed: load everything and try again
+                        self.wait_for_tables(self.loader.sheets, should_stop)
+                        result = self.run_test_case(tc)
+                    if budget is not None and result["Source"] == "executed":
+                        budget.record(position, result["Duration (s)"])
+                if budget is not None and position in budget.open:
+                    budget.release(position, f"not executed: {result['Error/Details']}")
+                results_by_position[position] = result
+                if self.journal_key and result["Status"] not in ("SKIPPED", "CANCELLED"):
+                    self.journal.record(self.journal_key, listed_positions[position], result)
+                if result["Status"] in FAILURE_STATUSES:
+                    failures += 1
+                if on_progress:
+                    on_progress(len(resumed) + len(carried) + done + 1)
+                if result["Status"] == "CANCELLED":
+                    break
+        finally:
+            self.governor.release()
+            if budget is not None:
+                self.extra_reports["Time Budget"] = budget.report(test_cases)
+            if self.loader:
+                self.wait_for_tables(self.loader.sheets)
+                self.loader.thread.join()
+                self.extra_reports["Pipelined Load"] = self.loader.report
+            self.drop_sample_tables()
+            self.should_stop = None
+            self.on_tick = None
+            self.run_deadline = None
+            if self.result_cache is not None:
+                self.result_cache.flush()
+            if self.history is not None:
+                finished = ([(listed_test_cases[position], result) for position, result in resumed.items()]
+                            + [(test_cases[position], result) for position, result in results_by_position.items()])
+                self.history.record(finished)
+                if self.run_data_key:
+                    self.history.store_results(
+                        (self.definition_key(tc), self.run_data_key, result) for tc, result in finished
+                        if result["Status"] not in ("SKIPPED", "CANCELLED")
+                    )
+        results_by_position = {listed_positions[position]: result for position, result in results_by_position.items()}
+        results_by_position.update(resumed)
+        results_by_position.update(carried)
+        if self.journal_key and len(results_by_position) == len(listed_test_cases) and not any(
+                result["Status"] in ("SKIPPED", "CANCELLED") for result in results_by_position.values()):
+            self.journal.finish(self.journal_key)
+        # A cancel leaves tests unrun; they keep their listed row so results line up with test_cases
+        return [results_by_position[position] if position in results_by_position
+                else self.skipped_result(tc, "Not run: the run was cancelled.", "CANCELLED")
+                for position, tc in enumerate(listed_test_cases)]
+
+    def library_digest(self):
+        if self.validation_lib is None:
+            return None
+        with open(self.validation_lib.__file__, "rb") as source:
+            return hashlib.sha1(source.read()).hexdigest()
+
+    def data_key(self):
+        data = [(table, self.fingerprint(table)) for table in user_tables(self.db_conn)]
+        return hashlib.sha1(json.dumps(data, default=str).encode()).hexdigest()
+
+    def definition_key(self, tc):
+        key_parts = [RESULT_CACHE_VERSION, tc.get("Suite", ""), str(tc['TC_Name']), tc['Call Type'], tc['SQL/Keyword'],
+                     tc['Expected_Result'], tc.get("Parameters"), tc.get("Parameter Error"), self.fixtures]
+        if tc['Call Type'] == "KEYWORD":
+            key_parts.append(self.library_digest())
+        return hashlib.sha1(json.dumps(key_parts, default=str).encode()).hexdigest()
+
+    def run_fingerprint(self, test_cases):
+        """Identify a run by its tests, the data, the fixtures, the keyword library and the options."""
+        tests = [[tc.get("Suite", ""), str(tc['TC_Name']), tc['Call Type'], tc['SQL/Keyword'], tc['Expected_Result'],
+                  tc.get("Parameters"), tc.get("Parameter Error")] for tc in test_cases]
+        options = {name: value for name, value in self.options.items() if name != "resume"}
+        key_parts = [RESULT_CACHE_VERSION, tests, self.run_data_key, self.fixtures, self.library_digest(), options]
+        return hashlib.sha1(json.dumps(key_parts, default=str).encode()).hexdigest()
+
+    def carry_forward(self, test_cases, resumed):
+        """Return {position: last result} for the tests unchanged since their last run on the same data."""
+        if self.history is None or not self.run_data_key:
+            return {}
+        keys = {position: self.definition_key(tc) for position, tc in enumerate(test_cases) if position not in resumed}
+        previous = self.history.previous_results(set(keys.values()), self.run_data_key)
+        carried = {position: previous[key] for position, key in keys.items() if key in previous}
+        for result in carried.values():
+            result["Source"] = "carried forward"
+        self.stats["carried_forward"] = len(carried)
+        return carried
+
+    def resume(self, test_cases):
+        """Return {position: result} of an interrupted run of the same tests, and start journaling this one."""
+        self.journal_key = None
+        if self.journal is None or not self.db_conn:
+            return {}
+        self.journal_key = self.run_fingerprint(test_cases)
+        resumed = self.journal.load(self.journal_key) if self.options["resume"] else {}
+        if not resumed:
+            self.journal.start(self.journal_key)
+        for result in resumed.values():
+            result["Source"] = "resumed"
+        self.stats["resumed"] = len(resumed)
+        return resumed
+
+    def preflight(self, test_cases):
+        """Prepare every distinct SQL statement; returns (report rows, {position: (problem, error)})."""
+        # Tables created by SQL tests only outlive the test when writes are not isolated
+        created = {name.strip('"[]`').replace('""', '"').lower()
+                   for tc in test_cases if tc['Call Type'] == "SQL" and not self.options["isolate_writes"]
+                   for name in _CREATED_TABLE_RE.findall(tc['SQL/Keyword'])}
+        created |= {fixture["Fixture"].lower() for fixture in self.fixtures}
+        # Tables the loader has not written yet are expected, not missing
+        loading = set()
+        if self.loader:
+            loading = {table.lower() for table in self.loader.sheets if table not in self.loader.loaded}
+        # A keyword may create tables too, so a missing table is only a warning then
+        has_keywords = any(tc['Call Type'] == "KEYWORD" for tc in test_cases)
+        statements = {}
+        for position, tc in enumerate(test_cases):
+            if tc['Call Type'] != "SQL" or "Parameter Error" in tc:
+                continue
+            params = tc.get("Parameters") or ()
+            sqls = [tc['SQL/Keyword']]
+            if expectation_kind(tc['Expected_Result']) == "diff":
+                sqls.append(parse_diff_expectation(tc['Expected_Result'])[0])
+            for sql in sqls:
+                key = (normalize_sql(sql), json.dumps(params, default=str, sort_keys=True))
+                statements.setdefault(key, (sql, params, []))[2].append(position)
+
+        errors = [self.prepare_error(self.db_conn, sql, params) for sql, params, _ in statements.values()]
+
+        report = []
+        problems = {}
+        for (sql, params, positions), error in zip(statements.values(), errors):
+            if error is None:
+                continue
+            problem = preflight_problem(error)
+            if problem == "missing table" and error.split(":", 1)[1].strip().lower() in loading:
+                continue
+            warning_only = problem == "missing table" and (
+                error.split(":", 1)[1].strip().lower() in created or has_keywords
+            )
+            for position in positions:
+                if not warning_only:
+                    problems.setdefault(position, (problem, error))
+                report.append({
+                    "TC Name": test_cases[position]['TC_Name'],
+                    "Problem": problem,
+                    "Error": error,
+                    "SQL": sql,
+                    "Action": "warning only (may be created during the run)" if warning_only
+                    else {"report": "reported", "error": "marked ERROR", "abort": "run aborted"}[self.options["preflight"]],
+                })
+        return report, problems
+
+    @staticmethod
+    def prepare_error(conn, sql, params):
+        try:
+            conn.execute("EXPLAIN " + sql, params)
+        except sqlite3.Error as e:
+            return str(e)
+        return None
+
+    def preflight_result(self, tc, problem):
+        self.rows_fetched = self.bytes_fetched = 0
+        self.result_source = "pre-flight"
+        self.failing_rows = None
+        # The tables it names (lexically, when one is missing) let a later load of them re-validate the test
+        tables_read, _ = self.dependencies(tc)
+        return self.make_result(tc, "ERROR", "N/A", f"Pre-flight ({problem[0]}), not executed: {problem[1]}",
+                                tables_read)
+
+    def schedule(self, test_cases):
+        """Execution order: fail-first tiers, tests of one table back to back, barriers kept in place."""
+        if self.options["test_order"] != "fail-first" or self.history is None:
+            return list(range(len(test_cases)))
+        history = self.history.lookup(test_cases)
+        known_durations = sorted(h["duration"] for h in history if h and h["duration"] is not None)
+        default_cost = known_durations[len(known_durations) // 2] if known_durations else 0.0
+
+        order = []
+        segment = []
+        for position, tc in enumerate(test_cases):
+            tables_read, writes = self.dependencies(tc)
+            if (writes and not self.is_isolated(tc, writes)) or tc['Call Type'] != "SQL":
+                order.extend(self.order_segment(segment))
+                segment = []
+                order.append(position)
+                continue
+            past = history[position]
+            if past is None:
+                tier, cost = 1, default_cost
+            else:
+                tier = 0 if past["status"] in FAILURE_STATUSES else 2
+                cost = past["duration"] if past["duration"] is not None else default_cost
+            segment.append((position, tier, min(tables_read) if tables_read else "", cost))
+        order.extend(self.order_segment(segment))
+        return order
+
+    @staticmethod
+    def order_segment(segment):
+        groups = {}
+        for position, tier, table, cost in segment:
+            groups.setdefault((tier, table), []).append((cost, position))
+        ordered = []
+        for key in sorted(groups, key=lambda key: (key[0], sum(cost for cost, _ in groups[key]), key[1])):
+            ordered.extend(position for _, position in sorted(groups[key]))
+        return ordered
+
+    def budget_order(self, test_cases, order, budget):
+        """Reorder a schedule so higher-ranked tests run first, without moving anything across a barrier."""
+        ordered = []
+        segment = []
+        for position in order:
+            tc = test_cases[position]
+            tables_read, writes = self.dependencies(tc)
+            if (writes and not self.is_isolated(tc, writes)) or tc['Call Type'] != "SQL":
+                ordered.extend(sorted(segment, key=budget.rank.get))
+                segment = []
+                ordered.append(position)
+            else:
+                segment.append(position)
+        ordered.extend(sorted(segment, key=budget.rank.get))
+        return ordered
+
+    def pipeline_schedule(self, test_cases, needs):
+        """Execution order while data loads: each test once its tables are in, barriers kept in place."""
+        load_rank = {table: rank for rank, table in enumerate(self.loader.order)}
+        ready_at = []
+        latest = floor = -1
+        for position, tc in enumerate(test_cases):
+            ready = max([load_rank[table] for table in needs[position]] + [floor])
+            latest = max(latest, ready)
+            writes = not re.match(r"\s*(select|with)\b", tc['SQL/Keyword'], re.IGNORECASE)
+            if tc['Call Type'] != "SQL" or (writes and not self.options["isolate_writes"]):
+                ready = floor = latest
+            ready_at.append(ready)
+        return sorted(range(len(test_cases)), key=lambda position: (ready_at[position], position))
+
+    def loading(self):
+        return bool(self.loader) and len(self.loader.loaded) < len(self.loader.sheets)
+
+    def wait_for_tables(self, tables, should_stop=None):
+        """Wait until the loader has loaded tables; returns whether any new table arrived."""
+        before = len(self.loader.loaded)
+        with self.governor.lifted(), self.keeping_fingerprints():
+            self.stats["load_wait"] += self.loader.wait_for(self.db_conn, tables, should_stop)
+        if len(self.loader.loaded) == before:
+            return False
+        self.known_fingerprints.update(
+            (table, fingerprint) for table, fingerprint in self.loader.loaded.items() if fingerprint is not None
+        )
+        return True
+
+    def skipped_result(self, tc, reason, status="SKIPPED"):
+        self.rows_fetched = self.bytes_fetched = 0
+        self.result_source = "skipped"
+        self.failing_rows = None
+        return self.make_result(tc, status, "N/A", reason)
+
+    def build_fixtures(self):
+        """Create the Setup fixtures as TEMP tables, reusing each one whose SQL and sources are unchanged."""
+        self.db_conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS pvd_fixtures (name TEXT PRIMARY KEY, fixture_key TEXT, sources TEXT)"
+        )
+        report = []
+        for fixture in self.fixtures:
+            name = fixture["Fixture"]
+            row = {"Fixture": name, "Status": "", "Rows": "", "Build Time (s)": "", "Sources": "", "Error": ""}
+            started = time.monotonic()
+            try:
+                sources, writes = analyze_sql(self.db_conn, fixture["SQL"])
+                sources.discard(name)
+                row["Sources"] = ", ".join(sorted(sources))
+                if writes:
+                    # Unpreparable SQL also lands here; running it reports the real error
+                    self.db_conn.execute(f"SELECT * FROM ({fixture['SQL']}) LIMIT 0")
+                    raise sqlite3.DatabaseError("Fixture SQL must be a query (SELECT/WITH)")
+                key_parts = [fixture["SQL"], fixture["Indexes"], sorted((table, self.fingerprint(table)) for table in sources)]
+                if self.options["sample_mode"] != "off":
+                    key_parts.append(self.sample_description())
+                fixture_key = hashlib.sha1(json.dumps(key_parts).encode()).hexdigest()
+                stored = self.db_conn.execute(
+                    "SELECT fixture_key FROM temp.pvd_fixtures WHERE name = ?", (name,)
+                ).fetchone()
+                exists = self.db_conn.execute(
+                    "SELECT 1 FROM temp.sqlite_master WHERE type = 'table' AND name = ?", (name,)
+                ).fetchone()
+                if stored and stored[0] == fixture_key and exists:
+                    row["Status"] = "reused"
+                else:
+                    with self.keeping_fingerprints():
+                        self.db_conn.execute(f'DROP TABLE IF EXISTS temp."{name}"')
+                        self.db_conn.execute(f'CREATE TEMP TABLE "{name}" AS {fixture["SQL"]}')
+                        safe_name = re.sub(r'\W', '_', name)
+                        for number, columns in enumerate(fixture["Indexes"]):
+                            column_list = ", ".join(f'"{column}"' for column in columns)
+                            self.db_conn.execute(
+                                f'CREATE INDEX temp."pvd_fixture_{safe_name}_{number}" ON "{name}" ({column_list})'
+                            )
+                        self.db_conn.execute(
+                            "INSERT OR REPLACE INTO temp.pvd_fixtures VALUES (?, ?, ?)",
+                            (name, fixture_key, json.dumps(sorted(sources)))
+                        )
+                        self.db_conn.commit()
+                    row["Status"] = "built"
+                # Tests reading the fixture are cached against its key instead of a scan
+                self.known_fingerprints[name] = fixture_key
+                row["Rows"] = self.db_conn.execute(f'SELECT COUNT(*) FROM temp."{name}"').fetchone()[0]
+            except sqlite3.Error as e:
+                row["Status"] = "error"
+                row["Error"] = str(e)
+            row["Build Time (s)"] = round(time.monotonic() - started, 4)
+            report.append(row)
+        self.fixtures_stale = False
+        return report
+
+    def sample_description(self):
+        if self.options["sample_mode"] == "per-key":
+            return f"first {self.options['sample_per_key']} rows per {self.options['sample_key']}"
+        return f"{self.options['sample_percent']:g}% of rows per table"
+
+    def build_sample_tables(self):
+        """Shadow every table with a deterministic TEMP sample of the same name, so test SQL runs unchanged."""
+        threshold = int(SAMPLE_HASH_MODULUS * self.options["sample_percent"] / 100)
+        percent_filter = f"((rowid * 2654435761) % {SAMPLE_HASH_MODULUS}) < {threshold}"
+        report = []
+        for table in user_tables(self.db_conn):
+            columns = [row[1] for row in self.db_conn.execute(f'PRAGMA main.table_info("{table}")')]
+            key = self.options["sample_key"]
+            if self.options["sample_mode"] == "per-key" and key in columns:
+                column_list = ", ".join(f'"{column}"' for column in columns)
+                select_sql = (
+                    f'SELECT {column_list} FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY "{key}" ORDER BY rowid) '
+                    f'AS pvd_sample_rn FROM main."{table}") WHERE pvd_sample_rn <= {int(self.options["sample_per_key"])}'
+                )
+                method = f"first {self.options['sample_per_key']} per {key}"
+            else:
+                select_sql = f'SELECT * FROM main."{table}" WHERE {percent_filter}'
+                method = f"{self.options['sample_percent']:g}% by rowid hash"
+            try:
+                self.db_conn.execute(f'CREATE TEMP TABLE "{table}" AS {select_sql}')
+            except sqlite3.Error as e:
+                report.append({"Table": table, "Method": f"not sampled: {e}", "Total Rows": "", "Sampled Rows": ""})
+                continue
+            self.sampled_tables.append(table)
+            report.append({
+                "Table": table,
+                "Method": method,
+                "Total Rows": self.db_conn.execute(f'SELECT COUNT(*) FROM main."{table}"').fetchone()[0],
+                "Sampled Rows": self.db_conn.execute(f'SELECT COUNT(*) FROM temp."{table}"').fetchone()[0],
+            })
+        return report
+
+    def drop_sample_tables(self):
+        for table in self.sampled_tables:
+            self.db_conn.execute(f'DROP TABLE IF EXISTS temp."{table}"')
+        self.sampled_tables = []
+        # Tables scanned while shadowed were fingerprinted from their sample
+        self.fingerprint_cache.clear()
+
+    def run_index_advisor(self, test_cases):
+        proposals = {}
+        row_counts = {}
+        for tc in test_cases:
+            if tc['Call Type'] != "SQL":
+                continue
+            try:
+                params = tc.get("Parameters") or ()
+                if analyze_sql(self.db_conn, tc['SQL/Keyword'], params)[1]:
+                    continue
+                candidates = plan_index_candidates(self.db_conn, tc['SQL/Keyword'], params)
+            except sqlite3.Error:
+                continue  # unpreparable SQL is reported by the test itself
+            for table, columns in candidates:
+                if table not in row_counts:
+                    row_counts[table] = self.db_conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                if row_counts[table] < self.options["advisor_min_rows"]:
+                    continue
+                if len(columns) == 1 and columns[0] in indexed_leading_columns(self.db_conn, table):
+                    continue
+                proposal = proposals.setdefault((table, columns), {"tests": [], "sql": tc['SQL/Keyword'], "params": params})
+                proposal["tests"].append(str(tc['TC_Name']))
+
+        report = []
+        for (table, columns), proposal in proposals.items():
+            safe_name = re.sub(r'\W', '_', f"{table}_{'_'.join(columns)}")
+            index_name = f"pvd_idx_{safe_name}"
+            column_list = ", ".join(f'"{column}"' for column in columns)
+            row = {
+                "Table": table,
+                "Columns": ", ".join(columns),
+                "Index": f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table}" ({column_list})',
+                "Tests Affected": len(proposal["tests"]),
+                "Table Rows": row_counts[table],
+                # Each affected test stops reading the whole table for its lookups
+                "Est. Rows Avoided": row_counts[table] * len(proposal["tests"]),
+                "Status": "proposed",
+                "Before (s)": "",
+                "After (s)": "",
+                "Speedup": "",
+                "Tests": ", ".join(proposal["tests"]),
+            }
+            if self.options["index_advisor"] == "auto":
+                limit = self.options["advisor_probe_timeout"]
+                before, finished = self.probe_query_time(proposal["sql"], proposal["params"])
+                with self.keeping_fingerprints():
+                    self.db_conn.execute(row["Index"])
+                    self.db_conn.execute(f'ANALYZE "{table}"')
+                    self.db_conn.commit()
+                self.stats["indexes_created"] += 1
+                after, _ = self.probe_query_time(proposal["sql"], proposal["params"])
+                row["Status"] = "created"
+                row["Before (s)"] = round(before, 4) if finished else f">= {limit}"
+                row["After (s)"] = round(after, 4)
+                speedup = before / after if after > 0 else 0
+                row["Speedup"] = f"{speedup:.1f}x" if finished else f">= {speedup:.1f}x"
+            report.append(row)
+        return report
+
+    def fuse_aggregate_tests(self, test_cases):
+        """Answer compatible single-table aggregate tests with one conditional-aggregate scan per table."""
+        groups = {}
+        for tc in test_cases:
+            if (tc['Call Type'] != "SQL" or tc.get("Parameters")
+                    or expectation_kind(tc['Expected_Result']) in ("diff", "golden")):
+                continue
+            fused = fusable_aggregate(tc['SQL/Keyword'])
+            if not fused:
+                continue
+            if self.result_cache is not None:
+                tables_read, writes = self.dependencies(tc)
+                cache_key = self.persistent_cache_key(tc, tables_read, writes)
+                if cache_key and self.result_cache.get(cache_key):
+                    continue
+            table, expression = fused
+            try:
+                # One bad expression would fail the whole fused query
+                self.db_conn.execute(f'EXPLAIN SELECT {expression} FROM "{table}"')
+            except sqlite3.Error:
+                continue
+            members = groups.setdefault(table, {})
+            members.setdefault(normalize_sql(tc['SQL/Keyword']), (expression, []))[1].append(str(tc['TC_Name']))
+
+        report = []
+        for table, members in groups.items():
+            if len(members) < 2:
+                continue  # nothing to share
+            cache_keys = list(members)
+            for start in range(0, len(cache_keys), MAX_FUSED_AGGREGATES):
+                chunk = cache_keys[start:start + MAX_FUSED_AGGREGATES]
+                fused_sql = f'SELECT {", ".join(members[key][0] for key in chunk)} FROM "{table}"'
+                started = time.monotonic()
+                self.interrupt_reason = None
+                self.db_conn.set_progress_handler(self.check_limits, PROGRESS_HANDLER_OPS)
+                try:
+                    values = self.db_conn.execute(fused_sql).fetchone()
+                except sqlite3.Error:
+                    continue  # the tests run individually and report their own errors
+                finally:
+                    self.end_test_limits()
+                self.stats["executions"] += 1
+                for key, value in zip(chunk, values):
+                    self.query_cache[key] = QueryOutcome.from_rows([(value,)])
+                tests = [name for key in chunk for name in members[key][1]]
+                self.stats["fused_tests"] += len(tests)
+                report.append({
+                    "Table": table,
+                    "Queries Fused": len(chunk),
+                    "Tests Served": len(tests),
+                    "Scan Time (s)": round(time.monotonic() - started, 4),
+                    "Tests": ", ".join(tests),
+                })
+        return report
+
+    def probe_query_time(self, sql, params=()):
+        self.interrupt_reason = None
+        self.test_deadline = time.monotonic() + self.options["advisor_probe_timeout"]
+        self.db_conn.set_progress_handler(self.check_limits, PROGRESS_HANDLER_OPS)
+        started = time.monotonic()
+        try:
+            cursor = self.db_conn.execute(sql, params)
+            while cursor.fetchmany(5000):
+                pass
+            return time.monotonic() - started, True
+        except sqlite3.OperationalError:
+            if not self.interrupt_reason:
+                raise
+            return time.monotonic() - started, False
+        finally:
+            self.end_test_limits()
+            self.interrupt_reason = None
+
+    def check_limits(self):
+        # SQLite progress handler: a non-zero return interrupts the running statement
+        now = time.monotonic()
+        if self.on_tick and now - self.last_tick >= 0.1:
+            self.last_tick = now
+            self.on_tick()
+        if self.should_stop and self.should_stop():
+            self.interrupt_reason = "CANCELLED"
+        elif self.test_deadline and now > self.test_deadline:
+            self.interrupt_reason = "TIMEOUT"
+        elif self.run_deadline and now > self.run_deadline:
+            self.interrupt_reason = "RUN_TIMEOUT"
+        elif self.governor.over_heap():
+            self.interrupt_reason = "MEMORY"
+        return 1 if self.interrupt_reason else 0
+
+    def begin_test_limits(self):
+        self.interrupt_reason = None
+        self.governor.heap_exceeded = False
+        if self.options["test_timeout"]:
+            self.test_deadline = time.monotonic() + self.options["test_timeout"]
+        if self.db_conn:
+            self.db_conn.set_progress_handler(self.check_limits, PROGRESS_HANDLER_OPS)
+
+    def end_test_limits(self):
+        self.test_deadline = None
+        if self.db_conn:
+            self.db_conn.set_progress_handler(None, 0)
+
+    def interrupted_outcome(self, elapsed):
+        if self.interrupt_reason == "CANCELLED":
+            return "CANCELLED", "N/A", f"Cancelled by user after {elapsed:.1f}s."
+        if self.interrupt_reason == "MEMORY":
+            return "LIMIT", "N/A", self.governor.memory_message()
+        if self.interrupt_reason == "TIMEOUT":
+            return "TIMEOUT", "N/A", f"Exceeded the {self.options['test_timeout']}s per-test limit (elapsed {elapsed:.1f}s)."
+        return "TIMEOUT", "N/A", f"Run time limit reached while this test was running (elapsed {elapsed:.1f}s)."
+
+    def make_result(self, tc, status, actual_result_str, error_details, tables_read=(), duration=0.0):
+        if self.options["sample_mode"] != "off":
+            error_details = f"[SAMPLED: {self.sample_description()}] {error_details}".strip()
+        return {
+            "Suite": tc.get("Suite", ""),
+            "TC Name": tc['TC_Name'],
+            "Status": status,
+            "Expected Result": tc['Expected_Result'],
+            "Actual Result": bounded_text(actual_result_str),
+            "Error/Details": bounded_text(error_details),
+            "Call Type": tc['Call Type'],
+            "SQL/Keyword": tc['SQL/Keyword'],
+            "Parameters": parameter_label(tc["Parameters"]) if tc.get("Parameters") else "",
+            "Tables Read": ", ".join(sorted(tables_read)),
+            "Duration (s)": round(duration, 4),
+            "Rows Fetched": self.rows_fetched,
+            "Bytes Fetched": self.bytes_fetched,
+            "Source": self.result_source,
+            "Failing Rows": self.failing_rows,
+            "Sampled": self.sample_description() if self.options["sample_mode"] != "off" else ""
+        }
+
+    def run_test_case(self, tc):
+        call_type = tc['Call Type']
+        code = tc['SQL/Keyword']
+        expected_result = tc['Expected_Result']
+        params = tc.get("Parameters") or ()
+
+        status = "FAIL"
+        actual_result_str = ""
+        error_details = ""
+
+        tables_read = set()
+        self.rows_fetched = 0
+        self.bytes_fetched = 0
+        self.result_source = "executed"
+        self.failing_rows = None
+        started = time.monotonic()
+        isolated = False
+        self.begin_test_limits()
+        try:
+            tables_read, writes = self.dependencies(tc)
+            isolated = self.is_isolated(tc, writes)
+            if isolated:
+                self.begin_isolation()
+            cache_key = self.persistent_cache_key(tc, tables_read, writes)
+            cached = self.result_cache.get(cache_key) if cache_key else None
+            state_before = db_state(self.db_conn) if cache_key else None
+            if cached:
+                self.stats["cache_hits"] += 1
+                self.result_source = "cached"
+                status, actual_result_str, error_details = cached[:3]
+                self.failing_rows = cached[3] if len(cached) > 3 else None
+            elif call_type == "SQL":
+                if not self.db_conn:
+                    status = "ERROR"
+                    actual_result_str = "N/A"
+                    error_details = "No data files loaded for SQL test case."
+                elif "Parameter Error" in tc:
+                    status = "ERROR"
+                    actual_result_str = "N/A"
+                    error_details = f"Invalid Parameters: {tc['Parameter Error']}"
+                elif expectation_kind(expected_result) == "diff":
+                    status, actual_result_str, error_details = self.run_diff(code, expected_result, params)
+                elif expectation_kind(expected_result) == "golden":
+                    status, actual_result_str, error_details = self.run_golden(tc, code, params)
+                else:
+                    outcome = self.fetch_query_outcome(code, expected_result, params)
+                    status, actual_result_str, error_details = evaluate_sql_expectation(expected_result, outcome)
+                    if status == "FAIL" and outcome.first_rows and self.options["failing_rows"]:
+                        # The first rows were kept while streaming, so no second execution is needed
+                        self.failing_rows = {
+                            "columns": outcome.columns,
+                            "rows": [list(row) for row in outcome.first_rows[:self.options["failing_rows"]]],
+                        }
+            elif call_type == "KEYWORD":
+                if self.validation_lib is None:
+                    status = "ERROR"
+                    actual_result_str = "N/A"
+                    error_details = "validation_functions.py not found."
+                else:
+                    status, actual_result_str, error_details = self.run_keyword(code, expected_result)
+            else:
+                status = "ERROR"
+                error_details = f"Unknown Call Type: {call_type}"
+                actual_result_str = "N/A"
+            if cache_key and not cached and status in ("PASS", "FAIL") and db_state(self.db_conn) == state_before:
+                self.result_cache.put(cache_key, [status, actual_result_str, error_details, self.failing_rows])
+        except Exception as e:
+            if self.interrupt_reason:
+                status, actual_result_str, error_details = self.interrupted_outcome(time.monotonic() - started)
+            elif self.governor.violation(e):
+                status = "LIMIT"
+                error_details = self.governor.violation(e)
+                actual_result_str = "N/A"
+                if isinstance(e, ResourceLimitError):
+                    self.rows_fetched = max(self.rows_fetched, e.row_count)
+                    self.bytes_fetched = max(self.bytes_fetched, e.byte_count)
+            else:
+                status = "ERROR"
+                error_details = f"Validation Error: {e}"
+                actual_result_str = "N/A"
+        finally:
+            self.end_test_limits()
+            if isolated:
+                self.end_isolation()
+
+        return self.make_result(tc, status, actual_result_str, error_details, tables_read, time.monotonic() - started)
+
+    def is_isolated(self, tc, writes):
+        return bool(writes and tc['Call Type'] == "SQL" and self.db_conn and self.options["isolate_writes"])
+
+    def begin_isolation(self):
+        self.isolation_state = db_state(self.db_conn)
+        self.db_conn.execute("SAVEPOINT pvd_isolated_test")
+        self.isolating = True
+        self.stats["isolated_tests"] += 1
+
+    def end_isolation(self):
+        self.isolating = False
+        try:
+            self.db_conn.execute("ROLLBACK TO pvd_isolated_test")
+            self.db_conn.execute("RELEASE pvd_isolated_test")
+            # The rollback counts in total_changes but leaves the data as it was
+            if self.isolation_state == self.fingerprints_state:
+                self.fingerprints_state = db_state(self.db_conn)
+        except sqlite3.Error:
+            # The test ended the transaction itself (e.g. COMMIT), so its changes were kept
+            self.invalidate_cache()
+
+    def run_diff(self, sql, expected_result, params=()):
+        expected_sql, key_columns = parse_diff_expectation(expected_result)
+        actual_sql = sql.strip().rstrip(";")
+        columns = [desc[0] for desc in self.db_conn.execute(f"SELECT * FROM ({actual_sql}) LIMIT 0", params).description]
+        expected_columns = self.db_conn.execute(f"SELECT * FROM ({expected_sql}) LIMIT 0").description
+        if len(expected_columns) != len(columns):
+            return "ERROR", "N/A", (f"Column count differs: the query returns {len(columns)} columns, "
+                                    f"the expected side returns {len(expected_columns)}.")
+        lowered = [column.lower() for column in columns]
+        missing_keys = [key for key in key_columns if key.lower() not in lowered]
+        if missing_keys:
+            return "ERROR", "N/A", f"KEY column(s) not in the query result: {', '.join(missing_keys)}"
+        key_positions = [lowered.index(key.lower()) for key in key_columns]
+
+        state_before = db_state(self.db_conn)
+        counts, samples, differing, stopped = self.collect_diff(
+            diff_query(actual_sql, expected_sql, columns, key_positions), bool(key_positions), params
+        )
+        if db_state(self.db_conn) != state_before and not self.isolating:
+            self.invalidate_cache()
+
+        actual_result_str = (f"Missing {counts['missing']:,}, Extra {counts['extra']:,}"
+                             + (f", Changed {counts['changed']:,}" if key_positions else "")
+                             + (" (partial)" if stopped else ""))
+        if not differing:
+            return "PASS", actual_result_str, ""
+        details = f"Diff stopped after {differing:,} differing rows. " if stopped else ""
+        return "FAIL", actual_result_str, details + "Sample: " + "; ".join(samples)
+
+    def collect_diff(self, diff_sql, keyed, params=()):
+        """Stream a diff_query() result into (counts, samples, differing groups, stopped early)."""
+        # The test's query comes first in the diff, so its positional parameters still line up
+        cursor = self.db_conn.execute(diff_sql, params)
+        self.stats["executions"] += 1
+        counts = {"missing": 0, "extra": 0, "changed": 0}
+        samples = []
+        diff_limit = self.options["diff_limit"]
+        differing = 0
+        stopped = False
+        while not stopped:
+            rows = cursor.fetchmany(FETCH_BATCH_ROWS)
+            if not rows:
+                break
+            self.rows_fetched += len(rows)
+            self.bytes_fetched += estimate_result_bytes(rows)
+            self.governor.check_fetch(self.rows_fetched, self.bytes_fetched)
+            for only_actual, only_expected, actual_text, expected_text, key_text in rows:
+                if keyed and only_actual and only_expected:
+                    counts["changed"] += 1
+                    group_samples = [f"changed [{key_text}]: ({actual_text}) vs expected ({expected_text})"]
+                else:
+                    group_samples = []
+                    if only_expected:
+                        counts["missing"] += only_expected
+                        group_samples.append(f"missing x{only_expected}: ({expected_text})")
+                    if only_actual:
+                        counts["extra"] += only_actual
+                        group_samples.append(f"extra x{only_actual}: ({actual_text})")
+                samples.extend(group_samples[:DIFF_SAMPLE_ROWS - len(samples)])
+                differing += 1
+                if diff_limit and differing >= diff_limit:
+                    stopped = True
+                    break
+        cursor.close()
+        return counts, samples, differing, stopped
+
+    def run_golden(self, tc, sql, params=()):
+        """Compare a query's result with its golden snapshot, or rewrite the snapshot when re-baselining."""
+        path = golden_snapshot_path(tc['TC_Name'], tc.get("Suite", ""))
+        rebaseline = self.options["update_golden"]
+        cursor = self.db_conn.execute(sql, params)
+        self.stats["executions"] += 1
+        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        fingerprint = ResultFingerprint()
+        snapshot_file = None
+        if rebaseline:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            snapshot_file = open(path + ".tmp", "w", encoding="utf-8")
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_BATCH_ROWS)
+                if not rows:
+                    break
+                self.rows_fetched += len(rows)
+                self.bytes_fetched += estimate_result_bytes(rows)
+                self.governor.check_fetch(self.rows_fetched, self.bytes_fetched)
+                for row in rows:
+                    fingerprint.add(row)
+                    if snapshot_file:
+                        snapshot_file.write(json.dumps(list(row), default=str) + "\n")
+        finally:
+            cursor.close()
+            if snapshot_file:
+                snapshot_file.close()
+        if rebaseline:
+            write_golden_snapshot(path, columns, fingerprint)
+            return "PASS", f"Snapshot updated: {fingerprint.row_count:,} rows", f"Golden snapshot written to '{path}'."
+
+        header = read_golden_header(path)
+        if header is None:
+            return "ERROR", "N/A", f"No golden snapshot at '{path}'. Re-baseline the test to create it."
+        actual_result_str = f"{fingerprint.row_count:,} rows, fingerprint {fingerprint.hexdigest()}"
+        if header["columns"] == columns and header["fingerprint"] == fingerprint.hexdigest():
+            return "PASS", actual_result_str, ""
+        if len(header["columns"]) != len(columns):
+            return "FAIL", actual_result_str, f"Columns differ: snapshot has {header['columns']}, query returns {columns}."
+        details = f"Snapshot has {header['rows']:,} rows, fingerprint {header['fingerprint']}."
+        if header["columns"] != columns:
+            details += f" Column names differ: snapshot {header['columns']}, query {columns}."
+        # Only now is the snapshot read back, into a TEMP table the diff can join against
+        self.db_conn.execute("DROP TABLE IF EXISTS temp.pvd_golden")
+        names = [f"c{position}" for position in range(len(columns))]
+        self.db_conn.execute(f"CREATE TEMP TABLE pvd_golden ({', '.join(names)})")
+        try:
+            insert_sql = f"INSERT INTO temp.pvd_golden VALUES ({', '.join('?' * len(names))})"
+            for rows in read_golden_rows(path):
+                self.db_conn.executemany(insert_sql, rows)
+            counts, samples, differing, stopped = self.collect_diff(
+                diff_query(sql.strip().rstrip(";"), "SELECT * FROM temp.pvd_golden", columns, []), False, params
+            )
+        finally:
+            self.db_conn.execute("DROP TABLE IF EXISTS temp.pvd_golden")
+        if differing:
+            details += (f" Missing {counts['missing']:,}, Extra {counts['extra']:,}"
+                        + (" (partial)" if stopped else "") + ". Sample: " + "; ".join(samples))
+        return "FAIL", actual_result_str, details
+
+    def run_keyword(self, code, expected_result):
+        code_stripped = code.strip()
+        if "(" in code_stripped and code_stripped.endswith(")"):
+            func_name = code_stripped[:code_stripped.index("(")].strip()
+            args_str = code_stripped[code_stripped.index("("):].strip()
+            args_tuple = ast.literal_eval(args_str) if args_str else ()
+            if not isinstance(args_tuple, tuple):
+                args_tuple = (args_tuple,)
+        else:
+            func_name = code_stripped
+            args_tuple = ()
+        if not hasattr(self.validation_lib, func_name):
+            return "ERROR", "", f"Function '{func_name}' not found in validation_functions.py"
+        func = getattr(self.validation_lib, func_name)
+        state_before = db_state(self.db_conn) if self.db_conn else None
+        try:
+            result = func(self.db_conn, *args_tuple)
+        except TypeError:
+            result = func(*args_tuple)
+        if self.db_conn and db_state(self.db_conn) != state_before:
+            self.invalidate_cache()
+        actual_result_str = str(result)
+        self.bytes_fetched += len(actual_result_str)
+        if actual_result_str == expected_result:
+            return "PASS", actual_result_str, ""
+        return "FAIL", actual_result_str, f"Function returned '{actual_result_str}', expected '{expected_result}'"
+
+class RevalidationWorker(QThread):
+    result_ready = pyqtSignal(int, object)  # (report row, result)
+
+    def __init__(self, db_conn, validation_lib, table_fingerprints, fingerprints_state, use_cache, jobs, options=None,
+                 fixtures=None):
+        super().__init__()
+        self.db_conn = db_conn
+        self.fixtures = fixtures
+        self.options = options
+        self.validation_lib = validation_lib
+        self.table_fingerprints = dict(table_fingerprints)
+        self.fingerprints_state = fingerprints_state
+        self.current_fingerprints = None  # (fingerprints, db_state) once the jobs ran
+        self.use_cache = use_cache
+        self.jobs = jobs  # [(report row, prepared test case)]
+
+    def run(self):
+        # The cache connection must be created on the thread that uses it
+        result_cache = ResultCache() if self.use_cache else None
+        engine = ValidationEngine(
+            self.db_conn, self.validation_lib, result_cache, self.table_fingerprints, self.options,
+            fixtures=self.fixtures, fingerprints_state=self.fingerprints_state
+        )
+        try:
+            if self.fixtures:
+                engine.build_fixtures()
+            engine.governor.apply(self.db_conn)
+            for row, tc in self.jobs:
+                self.result_ready.emit(row, engine.run_test_case(tc))
+            self.current_fingerprints = engine.current_fingerprints()
+        finally:
+            engine.governor.release()
+            if result_cache is not None:
+                result_cache.close()
+
 class ExcelSQLValidatorApp(QWidget):
-    def __init__(self, db_mode="disk"):
+    def __init__(self, db_mode="disk", use_cache=True):
         super().__init__()
         self.setWindowTitle("PyValiData – Excel Data Validation Studio")
         self.setGeometry(100, 100, 1200, 800)
@@ -50,10 +2718,19 @@ class ExcelSQLValidatorApp(QWidget):
         self.db_conn = None
         self.db_mode = db_mode  # "ram" or "disk"
         self.data_files_loaded = {}
+        self.table_fingerprints = {}
+        self.fingerprints_state = None  # db_state the fingerprints describe
         self.test_cases_df = None
+        self.test_suites = []
         self.validation_results = []
+        self.report_extras = {}
+        self.last_test_cases = []
+        self.last_fixtures = []
+        self.revalidation_worker = None
         self.manual_sql_result_table = None
         self.db_file_path = None
+        self.use_cache = use_cache
+        self.run_options = dict(DEFAULT_RUN_OPTIONS)
 
         self.themes = ["Light", "Dark", "Blue"]
         self.current_theme = 0  # Start with Light
@@ -173,6 +2850,20 @@ class ExcelSQLValidatorApp(QWidget):
         self.run_validation_button.setEnabled(False)
         action_layout.addWidget(self.run_validation_button)
 
+        self.use_cache_checkbox = QCheckBox("Reuse cached results for unchanged data")
+        self.use_cache_checkbox.setChecked(self.use_cache)
+        action_layout.addWidget(self.use_cache_checkbox)
+
+        self.run_matrix_button = QPushButton("Run Environment Matrix...")
+        self.run_matrix_button.setToolTip("Run the loaded test cases against several environment folders in parallel")
+        self.run_matrix_button.clicked.connect(self.run_environment_matrix)
+        self.run_matrix_button.setEnabled(False)
+        action_layout.addWidget(self.run_matrix_button)
+
+        self.run_options_button = QPushButton("Run Options...")
+        self.run_options_button.clicked.connect(self.open_run_options_dialog)
+        action_layout.addWidget(self.run_options_button)
+
         self.clear_all_button = QPushButton("Clear All")
         self.clear_all_button.clicked.connect(self.clear_all)
         action_layout.addWidget(self.clear_all_button)
@@ -180,13 +2871,11 @@ class ExcelSQLValidatorApp(QWidget):
         main_layout.addLayout(action_layout)
 
         # --- Validation Report Area ---
-        report_label = QLabel("Validation Report:")
-        main_layout.addWidget(report_label)
+        self.report_label = QLabel("Validation Report:")
+        main_layout.addWidget(self.report_label)
         self.report_table = QTableWidget()
-        self.report_table.setColumnCount(5)
-        self.report_table.setHorizontalHeaderLabels(
-            ["TC Name", "Status", "Expected Result", "Actual Result", "Error/Details"]
-        )
+        self.report_table.setColumnCount(len(REPORT_TABLE_COLUMNS))
+        self.report_table.setHorizontalHeaderLabels([header for header, _ in REPORT_TABLE_COLUMNS])
         self.report_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.report_table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.report_table.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -196,7 +2885,17 @@ class ExcelSQLValidatorApp(QWidget):
         self.save_report_button = QPushButton("Save Report to Excel")
         self.save_report_button.clicked.connect(self.save_report_to_excel)
         self.save_report_button.setEnabled(False)
-        main_layout.addWidget(self.save_report_button)
+        report_button_row = QHBoxLayout()
+        report_button_row.addWidget(self.save_report_button)
+        self.performance_summary_button = QPushButton("Performance Summary")
+        self.performance_summary_button.clicked.connect(self.show_performance_summary)
+        self.performance_summary_button.setEnabled(False)
+        report_button_row.addWidget(self.performance_summary_button)
+        # Always available: the journal outlives a crashed or still-running validation
+        self.save_partial_report_button = QPushButton("Save Partial Report...")
+        self.save_partial_report_button.clicked.connect(self.save_partial_report)
+        report_button_row.addWidget(self.save_partial_report_button)
+        main_layout.addLayout(report_button_row)
 
         # --- Manual SQL Execution Area (Side by Side) ---
         manual_sql_area = QHBoxLayout()
@@ -260,24 +2959,28 @@ class ExcelSQLValidatorApp(QWidget):
 
     def update_run_button_state(self):
         # Enable Run Validation if the test case file is loaded
+        if self.revalidating():
+            return
         if self.test_cases_df is not None:
             self.run_validation_button.setEnabled(True)
         else:
             self.run_validation_button.setEnabled(False)
+        self.run_matrix_button.setEnabled(self.test_cases_df is not None)
 
     def connect_db(self):
         if self.db_conn:
             self.db_conn.close()
         if self.db_mode == "ram":
             self.db_file_path = ":memory:"
-            self.db_conn = sqlite3.connect(self.db_file_path)
+            # Shared with RevalidationWorker, which never runs alongside another writer
+            self.db_conn = sqlite3.connect(self.db_file_path, check_same_thread=False)
             print("Connected to in-memory SQLite database.")
         else:
             # Always start with a fresh DB file
             if os.path.exists("edm_validation_temp.db"):
                 os.remove("edm_validation_temp.db")
             self.db_file_path = "edm_validation_temp.db"
-            self.db_conn = sqlite3.connect(self.db_file_path)
+            self.db_conn = sqlite3.connect(self.db_file_path, check_same_thread=False)
             print("Connected to disk-based SQLite database: edm_validation_temp.db")
 
     def add_data_excel_files(self):
@@ -311,6 +3014,8 @@ class ExcelSQLValidatorApp(QWidget):
             QApplication.processEvents()
 
             sheet_counter = 0
+            changed_tables = set()
+            self.drop_stale_fingerprints()
             for file_path in selected_files:
                 if progress.wasCanceled():
                     break
@@ -327,10 +3032,12 @@ class ExcelSQLValidatorApp(QWidget):
                                     break
                                 df = pd.read_excel(xls, sheet_name=sheet_name)
                                 base_name = os.path.splitext(os.path.basename(file_path))[0]
-                                table_name = f'{base_name}.{sheet_name}'
-                                table_name = "".join(c for c in table_name if c.isalnum() or c in ['.', '_'])
+                                table_name = data_table_name(file_path, sheet_name)
+                                self.table_fingerprints.pop(table_name, None)
                                 df.to_sql(table_name, self.db_conn, if_exists='replace', index=False)
+                                self.table_fingerprints[table_name] = dataframe_fingerprint(df)
                                 loaded_sheets.append(table_name)
+                                changed_tables.add(table_name)
                                 print(f"Loaded '{sheet_name}' from '{base_name}' into table '{table_name}'")
                                 sheet_counter += 1
                                 progress.setValue(sheet_counter)
@@ -342,7 +3049,10 @@ class ExcelSQLValidatorApp(QWidget):
                     except Exception as e:
                         QMessageBox.warning(self, "Error Loading Data File", f"Could not load '{file_path}': {e}")
             progress.close()
+            # Loading replaced only the tables fingerprinted above
+            self.fingerprints_state = db_state(self.db_conn)
             self.update_run_button_state()
+            self.revalidate_affected_tests(changed_tables)
 
     def remove_data_excel_files(self):
         selected_items = self.loaded_data_files_list.selectedItems()
@@ -350,15 +3060,20 @@ class ExcelSQLValidatorApp(QWidget):
             QMessageBox.warning(self, "No Selection", "Please select file(s) to remove.")
             return
 
+        changed_tables = set()
+        if self.db_conn:
+            self.drop_stale_fingerprints()
         for item in selected_items:
             file_path = item.text()
             # Remove tables loaded from this file
             if file_path in self.data_files_loaded:
                 tables_to_drop = self.data_files_loaded[file_path]
+                changed_tables.update(tables_to_drop)
                 cursor = self.db_conn.cursor()
                 for table_name in tables_to_drop:
                     try:
                         cursor.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+                        self.table_fingerprints.pop(table_name, None)
                     except Exception as e:
                         print(f"Error dropping table {table_name}: {e}")
                 del self.data_files_loaded[file_path]
@@ -366,28 +3081,92 @@ class ExcelSQLValidatorApp(QWidget):
             row = self.loaded_data_files_list.row(item)
             self.loaded_data_files_list.takeItem(row)
 
+        if self.db_conn:
+            self.fingerprints_state = db_state(self.db_conn)
         self.update_run_button_state()
+        self.revalidate_affected_tests(changed_tables)
+
+    def revalidate_affected_tests(self, changed_tables):
+        if not changed_tables or not self.validation_results or not self.db_conn:
+            return
+        if self.revalidating():
+            return
+        # Tests reading a fixture built from a changed table are affected too
+        changed_tables = set(changed_tables) | fixture_dependents(self.db_conn, changed_tables)
+        jobs = []
+        for row, (tc, result) in enumerate(zip(self.last_test_cases, self.validation_results)):
+            tables_read = set(filter(None, result.get("Tables Read", "").split(", ")))
+            if ALL_TABLES in tables_read or tables_read & changed_tables:
+                jobs.append((row, tc))
+        if not jobs:
+            return
+        self.sql_status_label.setText(f"Re-validating {len(jobs)} affected test case(s)...")
+        self.set_data_actions_enabled(False)
+        self.revalidation_worker = RevalidationWorker(
+            self.db_conn, getattr(self, 'validation_functions_module', None),
+            self.table_fingerprints, self.fingerprints_state, self.use_cache_checkbox.isChecked(), jobs,
+            self.run_options, self.last_fixtures
+        )
+        self.revalidation_worker.result_ready.connect(self.on_test_case_revalidated)
+        self.revalidation_worker.finished.connect(self.on_revalidation_finished)
+        self.revalidation_worker.start()
+
+    def on_test_case_revalidated(self, row, result):
+        if row < len(self.validation_results):
+            self.validation_results[row] = result
+            self.set_report_row(row, result)
+
+    def on_revalidation_finished(self):
+        self.revalidation_worker.wait()
+        if self.revalidation_worker.current_fingerprints is not None:
+            self.table_fingerprints, self.fingerprints_state = self.revalidation_worker.current_fingerprints
+        self.set_data_actions_enabled(True)
+        self.sql_status_label.setText("Affected test cases re-validated")
+        QTimer.singleShot(2000, lambda: self.sql_status_label.setText(""))
+
+    def drop_stale_fingerprints(self):
+        # Manual SQL or tests that write changed the data since the fingerprints were taken
+        if db_state(self.db_conn) != self.fingerprints_state:
+            self.table_fingerprints = {}
+            self.fingerprints_state = db_state(self.db_conn)
+
+    def revalidating(self):
+        return self.revalidation_worker is not None and self.revalidation_worker.isRunning()
+
+    def set_data_actions_enabled(self, enabled):
+        # The worker shares self.db_conn (and its progress handler and transactions), so nothing else may use it
+        for button in (self.add_data_file_button, self.remove_data_file_button, self.clear_all_button,
+                       self.run_manual_sql_button, self.show_tables_button, self.preview_query_builder_button):
+            button.setEnabled(enabled)
+        if enabled:
+            self.update_run_button_state()
+        else:
+            self.run_validation_button.setEnabled(False)
+            self.run_matrix_button.setEnabled(False)
 
 
     def load_test_case_excel(self):
         file_dialog = QFileDialog()
         file_dialog.setNameFilter("Excel Files (*.xlsx *.xls)")
-        file_path, _ = file_dialog.getOpenFileName(self, "Load Test Case Excel File")
+        file_paths, _ = file_dialog.getOpenFileNames(self, "Load Test Case Excel File(s)")
 
-        if file_path:
+        if file_paths:
             try:
-                # Assuming test cases are in the first sheet
-                self.test_cases_df = pd.read_excel(file_path)
-                # Ensure required columns exist
-                required_cols = ["TC_Name", "Call Type", "SQL/Keyword", "Expected_Result"]
-                if not all(col in self.test_cases_df.columns for col in required_cols):
-                    raise ValueError(f"Test case file must contain columns: {', '.join(required_cols)}")
-
-                self.tc_file_path_label.setText(f"Loaded: {os.path.basename(file_path)}")
+                # Every sheet with the TC columns is a suite; the others may hold parameters or fixtures
+                self.test_suites = load_test_suites(file_paths)
+                self.test_cases_df = suites_dataframe(self.test_suites)
+
+                file_names = ", ".join(os.path.basename(file_path) for file_path in file_paths)
+                self.tc_file_path_label.setText(f"Loaded: {file_names} ({len(self.test_suites)} suite(s))")
                 self.view_tc_file_button.setEnabled(True)
-                QMessageBox.information(self, "Success", f"Test cases loaded from '{os.path.basename(file_path)}'.")
+                QMessageBox.information(
+                    self, "Success",
+                    f"Loaded {len(self.test_cases_df)} test cases in {len(self.test_suites)} suite(s) from {file_names}:\n"
+                    + "\n".join(f"  {suite['Suite']}: {len(suite['Test Cases'])}" for suite in self.test_suites)
+                )
             except Exception as e:
                 self.test_cases_df = None
+                self.test_suites = []
                 self.tc_file_path_label.setText("No test case file loaded.")
                 self.view_tc_file_button.setEnabled(False)
                 QMessageBox.warning(self, "Error Loading TC File", f"Could not load test cases: {e}")
@@ -427,153 +3206,231 @@ class ExcelSQLValidatorApp(QWidget):
             QMessageBox.warning(self, "No Test Cases", "No test case file loaded. Please load test cases first.")
             return
 
-        required_cols = ["TC_Name", "Call Type", "SQL/Keyword", "Expected_Result"]
-        if not all(col in self.test_cases_df.columns for col in required_cols):
-            QMessageBox.critical(self, "TC File Error", f"Test case file must contain columns: {', '.join(required_cols)}")
+        if not all(col in self.test_cases_df.columns for col in REQUIRED_TC_COLUMNS):
+            QMessageBox.critical(self, "TC File Error", f"Test case file must contain columns: {', '.join(REQUIRED_TC_COLUMNS)}")
             return
 
-        needs_keywords = any(str(tc['Call Type']).strip().upper() == "KEYWORD" for _, tc in self.test_cases_df.iterrows())
+        # All suites run in one pass, so they share deduplication, scans and scheduling
+        suites = self.test_suites or [{"Suite": "", "Test Cases": self.test_cases_df, "Sheets": {}}]
+        test_cases, self.last_fixtures = prepare_suite_test_cases(suites)
+        if self.run_options["test_filter"]:
+            test_cases = select_test_cases(test_cases, self.run_options["test_filter"])
+            if not test_cases:
+                QMessageBox.information(self, "No Test Cases",
+                                        f"No test case matches the filter '{self.run_options['test_filter']}'.")
+                return
+        self.last_test_cases = test_cases
         validation_lib = getattr(self, 'validation_functions_module', None)
-        keyword_lib_missing = needs_keywords and (validation_lib is None)
+        result_cache = ResultCache() if self.use_cache_checkbox.isChecked() else None
+        history = RunHistory()
+        journal = RunJournal()
+        engine = ValidationEngine(
+            self.db_conn, validation_lib, result_cache, self.table_fingerprints, self.run_options, history,
+            self.last_fixtures, journal, fingerprints_state=self.fingerprints_state
+        )
 
-        total = len(self.test_cases_df)
-        progress = QProgressDialog("Running validation...", "", 0, total, self)
+        total = len(test_cases)
+        progress = QProgressDialog("Running validation...", "Cancel", 0, total, self)
         progress.setWindowTitle("Progress")
         progress.setWindowModality(Qt.WindowModal)
         progress.setMinimumDuration(0)
         progress.setValue(0)
         progress.show()
-        progress.setCancelButton(None)
 
-        for index, tc in self.test_cases_df.iterrows():
-            if progress.wasCanceled():
-                break
-            tc_name = tc['TC_Name']
-            call_type = str(tc['Call Type']).strip().upper()
-            code = str(tc['SQL/Keyword']).strip()
-            expected_result = str(tc['Expected_Result']).strip()
+        try:
+            # processEvents during long queries keeps the Cancel button responsive
+            self.validation_results = engine.run(
+                test_cases, on_progress=progress.setValue, should_stop=progress.wasCanceled,
+                on_tick=QApplication.processEvents
+            )
+            self.table_fingerprints, self.fingerprints_state = engine.current_fingerprints()
+        finally:
+            if result_cache is not None:
+                result_cache.close()
+            history.close()
+            journal.close()
+
+        progress.close()
+        self.report_extras = engine.extra_reports
+        if self.run_options["sample_mode"] != "off":
+            self.report_label.setText(
+                f"Validation Report (SAMPLED RUN: {engine.sample_description()} – not a full validation):"
+            )
+        else:
+            self.report_label.setText("Validation Report:")
+        self.display_results_in_table()
+        self.save_report_button.setEnabled(True)
+        self.performance_summary_button.setEnabled(True)
+        cancelled = any(result["Status"] == "CANCELLED" for result in self.validation_results)
+        suites = suite_summary(self.validation_results)
+        preflight_rows = [row for row in engine.extra_reports.get("Pre-flight", []) if not row["Action"].startswith("warning")]
+        QMessageBox.information(
+            self, "Validation Complete",
+            ("Validation was cancelled." if cancelled
+             else "Validation was aborted by the pre-flight check." if engine.aborted
+             else "All test cases have been executed.")
+            + (f"\nPre-flight found {len(preflight_rows)} test(s) whose SQL cannot be prepared "
+               "(see Performance Summary / saved report)." if preflight_rows else "")
+            + ("\n\n" + "\n".join(f"{row['Suite']}: {row['PASS']}/{row['Tests']} passed" for row in suites)
+               if len(suites) > 1 else "")
+            + (f"\nResults are from a SAMPLED run ({engine.sample_description()})."
+               if self.run_options["sample_mode"] != "off" else "")
+            + (f"\nResumed an interrupted run: {engine.stats['resumed']} result(s) taken from its journal."
+               if engine.stats['resumed'] else "")
+            + (f"\nUnchanged tests carried forward from their last run: {engine.stats['carried_forward']}"
+               if self.run_options["changed_only"] else "")
+            + (f"\nFilter '{self.run_options['test_filter']}' selected {len(test_cases)} test case(s)."
+               if self.run_options["test_filter"] else "")
+            + (f"\nSkipped to stay within the time budget: {engine.stats['budget_skipped']} "
+               "(see Performance Summary / saved report)." if self.run_options["time_budget"] else "")
+            + "\n\n"
+            f"Queries executed: {engine.stats['executions']}\n"
+            f"Duplicate executions saved: {engine.stats['executions_saved']}\n"
+            f"Results reused from cache: {engine.stats['cache_hits']}"
+            + (f"\nTests answered by shared table scans: {engine.stats['fused_tests']}" if engine.stats['fused_tests'] else "")
+            + (f"\nMutating tests rolled back: {engine.stats['isolated_tests']}" if engine.stats['isolated_tests'] else "")
+            + (f"\nIndexes proposed by the advisor: {len(engine.extra_reports['Index Advisor'])}"
+               f" (created: {engine.stats['indexes_created']})"
+               if "Index Advisor" in engine.extra_reports else "")
+        )
 
-            status = "FAIL"
-            actual_result_str = ""
-            error_details = ""
+    def run_environment_matrix(self):
+        environments = {}
+        while True:
+            folder = QFileDialog.getExistingDirectory(
+                self, f"Select data folder for environment {len(environments) + 1} (Cancel when done)"
+            )
+            if not folder:
+                break
+            environments[os.path.basename(os.path.normpath(folder)) or folder] = [folder]
+        if not environments:
+            return
+        suites = self.test_suites or [{"Suite": "", "Test Cases": self.test_cases_df, "Sheets": {}}]
+        test_cases, fixtures = prepare_suite_test_cases(suites)
+        if self.run_options["test_filter"]:
+            test_cases = select_test_cases(test_cases, self.run_options["test_filter"])
 
+        progress = QProgressDialog(f"Running {len(test_cases)} test cases in {len(environments)} environment(s)...",
+                                   "Cancel", 0, 0, self)
+        progress.setWindowTitle("Environment Matrix")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.show()
+        cancelled = []
+        # The environments run on worker threads; the UI only polls for completion and Cancel
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(
+                run_matrix, environments, test_cases, fixtures, getattr(self, 'validation_functions_module', None),
+                dict(self.run_options), self.use_cache_checkbox.isChecked(), lambda: bool(cancelled)
+            )
+            while not future.done():
+                QApplication.processEvents()
+                if progress.wasCanceled():
+                    cancelled.append(True)
+                time.sleep(0.05)
+            progress.close()
             try:
-                if call_type == "SQL":
-                    if not self.db_conn:
-                        status = "ERROR"
-                        actual_result_str = "N/A"
-                        error_details = "No data files loaded for SQL test case."
-                    else:
-                        cursor = self.db_conn.cursor()
-                        cursor.execute(code)
-                        query_results = cursor.fetchall()
-                        actual_result_str = str(query_results)
-                        # --- Compare Actual vs. Expected (reuse your logic here) ---
-                        if "0 rows" in expected_result:
-                            if not query_results:
-                                status = "PASS"
-                            else:
-                                actual_result_str = f"{len(query_results)} rows found."
-                        elif expected_result.startswith("COUNT = "):
-                            expected_count = int(expected_result.split("=")[1].strip())
-                            actual_count = len(query_results)
-                            actual_result_str = f"COUNT = {actual_count}"
-                            if actual_count == expected_count:
-                                status = "PASS"
-                        elif expected_result.lower() == "no records":
-                            if not query_results:
-                                status = "PASS"
-                            else:
-                                actual_result_str = f"{len(query_results)} records found."
-                        elif expected_result.lower() == "records exist":
-                            if query_results:
-                                status = "PASS"
-                                actual_result_str = f"{len(query_results)} records exist."
-                            else:
-                                actual_result_str = "No records found."
-                        elif query_results and len(query_results) == 1 and len(query_results[0]) == 1:
-                            if str(query_results[0][0]).strip() == expected_result:
-                                status = "PASS"
-                                actual_result_str = str(query_results[0][0])
-                            else:
-                                actual_result_str = str(query_results[0][0])
-                        else:
-                            if actual_result_str == expected_result:
-                                status = "PASS"
-                            else:
-                                error_details = f"Generic comparison failed. Actual: '{actual_result_str}', Expected: '{expected_result}'"
-                elif call_type == "KEYWORD":
-                    if keyword_lib_missing:
-                        status = "ERROR"
-                        actual_result_str = "N/A"
-                        error_details = "validation_functions.py not found."
-                    else:
-                        code_stripped = code.strip()
-                        if "(" in code_stripped and code_stripped.endswith(")"):
-                            func_name = code_stripped[:code_stripped.index("(")].strip()
-                            args_str = code_stripped[code_stripped.index("("):].strip()
-                            args_tuple = ast.literal_eval(args_str) if args_str else ()
-                            if not isinstance(args_tuple, tuple):
-                                args_tuple = (args_tuple,)
-                        else:
-                            func_name = code_stripped
-                            args_tuple = ()
-                        if hasattr(validation_lib, func_name):
-                            func = getattr(validation_lib, func_name)
-                            try:
-                                result = func(self.db_conn, *args_tuple)
-                            except TypeError:
-                                result = func(*args_tuple)
-                            actual_result_str = str(result)
-                            if actual_result_str == expected_result:
-                                status = "PASS"
-                            else:
-                                error_details = f"Function returned '{actual_result_str}', expected '{expected_result}'"
-                        else:
-                            status = "ERROR"
-                            error_details = f"Function '{func_name}' not found in validation_functions.py"
-                else:
-                    status = "ERROR"
-                    error_details = f"Unknown Call Type: {call_type}"
-                    actual_result_str = "N/A"
+                results_by_environment = future.result()
             except Exception as e:
-                status = "ERROR"
-                error_details = f"Validation Error: {e}"
-                actual_result_str = "N/A"
+                QMessageBox.critical(self, "Environment Matrix", f"Matrix run failed: {e}")
+                return
+        self.show_matrix_results(results_by_environment)
 
-            self.validation_results.append({
-                "TC Name": tc_name,
-                "Status": status,
-                "Expected Result": expected_result,
-                "Actual Result": actual_result_str,
-                "Error/Details": error_details,
-                "Call Type": call_type,
-                "SQL/Keyword": code
-            })
-            progress.setValue(index + 1)
+    def show_matrix_results(self, results_by_environment):
+        rows = matrix_rows(results_by_environment)
+        environments = list(results_by_environment)
+        columns = ["Suite", "TC Name"] + environments + ["Same Everywhere"]
+        dlg = QDialog(self)
+        dlg.setWindowTitle("Environment Matrix")
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(" | ".join(
+            f"{env}: {sum(1 for r in results if r['Status'] == 'PASS')}/{len(results)} passed"
+            for env, results in results_by_environment.items()
+        )))
+        table = QTableWidget()
+        table.setColumnCount(len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setRowCount(len(rows))
+        status_colors = {"PASS": Qt.green, "FAIL": Qt.red, "ERROR": Qt.darkRed, "TIMEOUT": QColor("orange"),
+                         "LIMIT": Qt.magenta}
+        for i, row in enumerate(rows):
+            for j, column in enumerate(columns):
+                item = QTableWidgetItem(str(row.get(column, "NOT RUN")))
+                if column in environments:
+                    item.setToolTip(str(row.get(f"{column} Actual", "")))
+                    item.setBackground(status_colors.get(row.get(column), Qt.gray))
+                table.setItem(i, j, item)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(table)
+        save_button = QPushButton("Save Matrix Report")
 
-        progress.close()
-        self.display_results_in_table()
-        self.save_report_button.setEnabled(True)
-        QMessageBox.information(self, "Validation Complete", "All test cases have been executed.")
+        def save():
+            file_path, _ = QFileDialog.getSaveFileName(dlg, "Save Matrix Report", "", "Excel Files (*.xlsx)")
+            if file_path:
+                try:
+                    write_matrix_report(file_path, results_by_environment)
+                    QMessageBox.information(dlg, "Report Saved", f"Matrix report saved to '{file_path}'.")
+                except Exception as e:
+                    QMessageBox.critical(dlg, "Error Saving Report", f"Could not save report: {e}")
+
+        save_button.clicked.connect(save)
+        layout.addWidget(save_button)
+        dlg.setLayout(layout)
+        dlg.resize(900, 600)
+        dlg.exec_()
 
     def display_results_in_table(self):
         self.report_table.setRowCount(len(self.validation_results))
         for row_idx, result in enumerate(self.validation_results):
-            self.report_table.setItem(row_idx, 0, QTableWidgetItem(result["TC Name"]))
-            self.report_table.setItem(row_idx, 1, QTableWidgetItem(result["Status"]))
-            self.report_table.setItem(row_idx, 2, QTableWidgetItem(result["Expected Result"]))
-            self.report_table.setItem(row_idx, 3, QTableWidgetItem(result["Actual Result"]))
-            self.report_table.setItem(row_idx, 4, QTableWidgetItem(result["Error/Details"]))
+            self.set_report_row(row_idx, result)
 
-            # Color code status
-            if result["Status"] == "PASS":
-                self.report_table.item(row_idx, 1).setBackground(Qt.green)
-            elif result["Status"] == "FAIL":
-                self.report_table.item(row_idx, 1).setBackground(Qt.red)
-            elif result["Status"] == "ERROR":
-                self.report_table.item(row_idx, 1).setBackground(Qt.darkRed)
+    def set_report_row(self, row_idx, result):
+        for col_idx, (_, key) in enumerate(REPORT_TABLE_COLUMNS):
+            self.report_table.setItem(row_idx, col_idx, QTableWidgetItem(str(result.get(key, ""))))
 
+        # Color code status
+        status_column = [key for _, key in REPORT_TABLE_COLUMNS].index("Status")
+        if result["Status"] == "PASS":
+            self.report_table.item(row_idx, status_column).setBackground(Qt.green)
+        elif result["Status"] == "FAIL":
+            self.report_table.item(row_idx, status_column).setBackground(Qt.red)
+        elif result["Status"] == "ERROR":
+            self.report_table.item(row_idx, status_column).setBackground(Qt.darkRed)
+        elif result["Status"] == "TIMEOUT":
+            self.report_table.item(row_idx, status_column).setBackground(QColor("orange"))
+        elif result["Status"] == "LIMIT":
+            self.report_table.item(row_idx, status_column).setBackground(Qt.magenta)
+        elif result["Status"] in ("CANCELLED", "SKIPPED"):
+            self.report_table.item(row_idx, status_column).setBackground(Qt.gray)
+
+
+    def show_performance_summary(self):
+        if not self.validation_results:
+            QMessageBox.information(self, "No Report", "No validation results to summarize.")
+            return
+        slowest_rows, table_rows = performance_summary(self.validation_results)
+        sections = [(f"Slowest {SLOWEST_TESTS_COUNT} tests:", slowest_rows), ("Time by table:", table_rows)]
+        sections += [(f"{name}:", rows) for name, rows in self.report_extras.items() if rows]
+        dlg = QDialog(self)
+        dlg.setWindowTitle("Performance Summary")
+        layout = QVBoxLayout()
+        for title, rows in sections:
+            layout.addWidget(QLabel(title))
+            table = QTableWidget()
+            columns = list(rows[0].keys()) if rows else []
+            table.setColumnCount(len(columns))
+            table.setHorizontalHeaderLabels(columns)
+            table.setRowCount(len(rows))
+            for i, row in enumerate(rows):
+                for j, column in enumerate(columns):
+                    table.setItem(i, j, QTableWidgetItem(str(row[column])))
+            table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+            table.setEditTriggers(QTableWidget.NoEditTriggers)
+            layout.addWidget(table)
+        dlg.setLayout(layout)
+        dlg.resize(800, 600)
+        dlg.exec_()
 
     def save_report_to_excel(self):
         if not self.validation_results:
@@ -586,12 +3443,27 @@ class ExcelSQLValidatorApp(QWidget):
 
         if file_path:
             try:
-                report_df = pd.DataFrame(self.validation_results)
-                report_df.to_excel(file_path, index=False)
+                write_report(file_path, self.validation_results, self.report_extras)
                 QMessageBox.information(self, "Report Saved", f"Validation report saved to '{file_path}'.")
             except Exception as e:
                 QMessageBox.critical(self, "Error Saving Report", f"Could not save report: {e}")
 
+    def save_partial_report(self):
+        file_dialog = QFileDialog()
+        file_dialog.setDefaultSuffix("xlsx")
+        file_path, _ = file_dialog.getSaveFileName(self, "Save Partial Report", "", "Excel Files (*.xlsx)")
+        if not file_path:
+            return
+        try:
+            count = write_partial_report(file_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Error Saving Report", f"Could not save partial report: {e}")
+            return
+        if count:
+            QMessageBox.information(self, "Report Saved", f"Partial report with {count} result(s) saved to '{file_path}'.")
+        else:
+            QMessageBox.information(self, "No Partial Results", "There is no unfinished run with journaled results.")
+
     def clear_all(self):
         if self.db_conn:
             self.db_conn.close()
@@ -603,14 +3475,22 @@ class ExcelSQLValidatorApp(QWidget):
             except Exception:
                 pass
         self.data_files_loaded = {}
+        self.table_fingerprints = {}
+        self.fingerprints_state = None  # db_state the fingerprints describe
         self.test_cases_df = None
+        self.test_suites = []
         self.validation_results = []
+        self.report_extras = {}
+        self.last_test_cases = []
+        self.last_fixtures = []
 
+        self.report_label.setText("Validation Report:")
         self.loaded_data_files_list.clear()
         self.tc_file_path_label.setText("No test case file loaded.")
         self.view_tc_file_button.setEnabled(False)
         self.report_table.setRowCount(0)
         self.save_report_button.setEnabled(False)
+        self.performance_summary_button.setEnabled(False)
         self.update_run_button_state()
         QMessageBox.information(self, "Cleared", "All loaded data and test cases have been cleared.")
 
@@ -631,18 +3511,26 @@ class ExcelSQLValidatorApp(QWidget):
             self.sql_status_label.setText("No data loaded. Please load Excel data files first.")
             return
 
+        # The run options' caps keep a runaway query from filling the table (and the process)
+        governor = ResourceGovernor(self.run_options)
         try:
+            governor.apply(self.db_conn)
+            self.db_conn.set_progress_handler(lambda: 1 if governor.over_heap() else 0, PROGRESS_HANDLER_OPS)
             cursor = self.db_conn.cursor()
             cursor.execute(sql)
             if cursor.description:  # SELECT or similar
-                rows = cursor.fetchall()
+                rows, stopped = governor.fetch_rows(cursor)
                 columns = [desc[0] for desc in cursor.description]
+                cursor.close()
                 self.manual_sql_result_table.setColumnCount(len(columns))
                 self.manual_sql_result_table.setHorizontalHeaderLabels(columns)
                 self.manual_sql_result_table.setRowCount(len(rows))
                 for i, row in enumerate(rows):
                     for j, value in enumerate(row):
                         self.manual_sql_result_table.setItem(i, j, QTableWidgetItem(str(value)))
+                if stopped:
+                    self.sql_status_label.setText(f"Showing the first {len(rows):,} rows. {stopped}")
+                    return
                 self.sql_status_label.setText("Executed successfully")
             else:  # Non-SELECT (INSERT/UPDATE/DELETE)
                 self.db_conn.commit()
@@ -654,11 +3542,16 @@ class ExcelSQLValidatorApp(QWidget):
             # Clear the status after 2 seconds
             QTimer.singleShot(2000, lambda: self.sql_status_label.setText(""))
         except Exception as e:
+            limit = governor.violation(e)
             self.manual_sql_result_table.setColumnCount(1)
             self.manual_sql_result_table.setRowCount(1)
             self.manual_sql_result_table.setHorizontalHeaderLabels(["Error"])
-            self.manual_sql_result_table.setItem(0, 0, QTableWidgetItem(str(e)))
-            self.sql_status_label.setText(f"Error in SQL")
+            self.manual_sql_result_table.setItem(0, 0, QTableWidgetItem(limit or str(e)))
+            self.sql_status_label.setText("Resource limit reached" if limit else f"Error in SQL")
+        finally:
+            self.db_conn.set_progress_handler(None, 0)
+            governor.release()
+            self.drop_stale_fingerprints()
 
     def display_sql_result(self, rows, columns):
         self.manual_sql_result_table.setColumnCount(len(columns))
@@ -685,14 +3578,25 @@ class ExcelSQLValidatorApp(QWidget):
 
     def show_report_table_context_menu(self, pos):
         item = self.report_table.itemAt(pos)
-        if item and item.column() == 0:  # Only for TC Name column
+        if item and REPORT_TABLE_COLUMNS[item.column()][1] == "TC Name":  # Only for TC Name column
             selected_rows = set(idx.row() for idx in self.report_table.selectedIndexes())
             if not selected_rows:
                 selected_rows = {item.row()}
             menu = QMenu(self)
             copy_sql_action = menu.addAction("Copy SQL/Keyword")
+            golden_rows = sorted(row for row in selected_rows
+                                 if expectation_kind(self.validation_results[row]["Expected Result"]) == "golden")
+            rebaseline_action = (menu.addAction("Re-baseline Golden Snapshot(s)")
+                                 if golden_rows and not self.revalidating() else None)
+            failing_result = self.validation_results[item.row()]
+            failing_rows_action = (menu.addAction("View Failing Rows")
+                                   if failing_result.get("Failing Rows") else None)
             action = menu.exec_(self.report_table.viewport().mapToGlobal(pos))
-            if action == copy_sql_action:
+            if action is not None and action == rebaseline_action:
+                self.rebaseline_golden_tests(golden_rows)
+            elif action is not None and action == failing_rows_action:
+                self.view_failing_rows(failing_result)
+            elif action == copy_sql_action:
                 sqls = []
                 for row in selected_rows:
                     # Try to get SQL/Keyword from validation_results
@@ -703,6 +3607,47 @@ class ExcelSQLValidatorApp(QWidget):
                 if sqls:
                     QApplication.clipboard().setText('\n'.join(sqls))
 
+    def view_failing_rows(self, result):
+        captured = result["Failing Rows"]
+        viewer = QWidget()
+        viewer.setWindowTitle(f"Failing Rows – {result['TC Name']}")
+        viewer.setGeometry(200, 200, 800, 400)
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(
+            f"First {len(captured['rows'])} row(s) of the result ({result['Actual Result']}), "
+            "captured while the test ran:"
+        ))
+        table = QTableWidget()
+        table.setColumnCount(len(captured["columns"]))
+        table.setHorizontalHeaderLabels([str(column) for column in captured["columns"]])
+        table.setRowCount(len(captured["rows"]))
+        for i, values in enumerate(captured["rows"]):
+            for j, value in enumerate(values):
+                table.setItem(i, j, QTableWidgetItem(str(value)))
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(table)
+        viewer.setLayout(layout)
+        viewer.show()
+        self.failing_rows_window = viewer
+
+    def rebaseline_golden_tests(self, rows):
+        reply = QMessageBox.question(
+            self, "Re-baseline Golden Snapshots",
+            f"Overwrite the golden snapshot of {len(rows)} test case(s) with their current results?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        options = dict(self.run_options, update_golden=True, sample_mode="off")
+        engine = ValidationEngine(self.db_conn, getattr(self, 'validation_functions_module', None), options=options,
+                                  fixtures=self.last_fixtures)
+        results = engine.run([self.last_test_cases[row] for row in rows], on_tick=QApplication.processEvents)
+        for row, result in zip(rows, results):
+            self.validation_results[row] = result
+            self.set_report_row(row, result)
+        QMessageBox.information(self, "Golden Snapshots", f"Re-baselined {len(rows)} golden snapshot(s).")
+
     def copy_sql_from_report(self):
         selected_rows = set(idx.row() for idx in self.report_table.selectedIndexes())
         if not selected_rows:
@@ -762,6 +3707,11 @@ class ExcelSQLValidatorApp(QWidget):
             cursor.movePosition(cursor.End)
             self.manual_sql_input.setTextCursor(cursor)
 
+    def open_run_options_dialog(self):
+        dlg = RunOptionsDialog(self.run_options, self)
+        if dlg.exec_() == QDialog.Accepted:
+            self.run_options = dlg.options
+
     def load_validation_functions_file(self):
         file_dialog = QFileDialog()
         file_dialog.setNameFilter("Python Files (*.py)")
@@ -775,11 +3725,8 @@ class ExcelSQLValidatorApp(QWidget):
             self.validation_functions_path = file_path
             self.validation_functions_path_label.setText(f"Loaded: {os.path.basename(file_path)}")
             # Dynamically import the module
-            spec = importlib.util.spec_from_file_location("validation_functions", file_path)
-            module = importlib.util.module_from_spec(spec)
             try:
-                spec.loader.exec_module(module)
-                self.validation_functions_module = module
+                self.validation_functions_module = load_validation_module(file_path)
             except Exception as e:
                 QMessageBox.critical(self, "Import Error", f"Could not import validation functions: {e}")
                 self.validation_functions_module = None
@@ -873,6 +3820,208 @@ class TablePreviewDialog(QDialog):
         self.selected_sql = sql
         QMessageBox.information(self, "SQL Inserted", f"SQL ready to insert:\n\n{sql}")
 
+class RunOptionsDialog(QDialog):
+    def __init__(self, options, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Run Options")
+        self.options = dict(options)
+        layout = QVBoxLayout()
+        form = QFormLayout()
+
+        self.test_timeout_spin = QSpinBox()
+        self.test_timeout_spin.setRange(0, 24 * 3600)
+        self.test_timeout_spin.setSpecialValueText("No limit")
+        self.test_timeout_spin.setSuffix(" s")
+        self.test_timeout_spin.setValue(int(self.options["test_timeout"]))
+        form.addRow("Time limit per test:", self.test_timeout_spin)
+
+        self.run_timeout_spin = QSpinBox()
+        self.run_timeout_spin.setRange(0, 7 * 24 * 60)
+        self.run_timeout_spin.setSpecialValueText("No limit")
+        self.run_timeout_spin.setSuffix(" min")
+        self.run_timeout_spin.setValue(int(self.options["run_timeout"] // 60))
+        form.addRow("Time limit for the whole run:", self.run_timeout_spin)
+
+        self.time_budget_spin = QSpinBox()
+        self.time_budget_spin.setRange(0, 7 * 24 * 60)
+        self.time_budget_spin.setSpecialValueText("Off")
+        self.time_budget_spin.setSuffix(" min")
+        self.time_budget_spin.setValue(int(self.options["time_budget"] // 60))
+        self.time_budget_spin.setToolTip(
+            "Run the highest-value tests that fit: by Priority column, then failed/new before passed, cheapest first.\n"
+            "Durations come from earlier runs; the plan is trimmed if tests run slower than predicted.\n"
+            "Skipped tests and the reasons are listed in the Time Budget sheet."
+        )
+        form.addRow("Time budget:", self.time_budget_spin)
+
+        self.preflight_combo = QComboBox()
+        self.preflight_combo.addItems(["off", "report", "error", "abort"])
+        self.preflight_combo.setCurrentText(self.options["preflight"])
+        self.preflight_combo.setToolTip(
+            "Prepare every SQL test before running anything and list syntax errors, missing tables and columns.\n"
+            "report: run them anyway; error: mark them ERROR without executing; abort: run nothing"
+        )
+        form.addRow("Pre-flight check:", self.preflight_combo)
+
+        self.index_advisor_combo = QComboBox()
+        self.index_advisor_combo.addItems(["off", "report", "auto"])
+        self.index_advisor_combo.setCurrentText(self.options["index_advisor"])
+        self.index_advisor_combo.setToolTip(
+            "report: list indexes that would remove full scans of large tables\n"
+            "auto: also create them and run ANALYZE before the tests"
+        )
+        form.addRow("Index advisor:", self.index_advisor_combo)
+
+        self.fuse_aggregates_checkbox = QCheckBox("Share one table scan across aggregate tests on the same table")
+        self.fuse_aggregates_checkbox.setChecked(self.options["fuse_aggregates"])
+        form.addRow("Query fusion:", self.fuse_aggregates_checkbox)
+
+        self.isolate_writes_checkbox = QCheckBox("Roll back the changes of UPDATE/DELETE/DDL tests after each one")
+        self.isolate_writes_checkbox.setChecked(self.options["isolate_writes"])
+        form.addRow("Isolate mutating tests:", self.isolate_writes_checkbox)
+        self.resume_checkbox = QCheckBox("Continue an interrupted run of the same tests on the same data")
+        self.resume_checkbox.setChecked(self.options["resume"])
+        form.addRow("Resume:", self.resume_checkbox)
+        self.changed_only_checkbox = QCheckBox("Run only new or edited tests; keep the last result of the others")
+        self.changed_only_checkbox.setChecked(self.options["changed_only"])
+        form.addRow("Changed tests only:", self.changed_only_checkbox)
+        self.test_filter_edit = QLineEdit(self.options["test_filter"])
+        self.test_filter_edit.setPlaceholderText("e.g. tag:smoke type:sql -name:*_slow")
+        self.test_filter_edit.setToolTip(
+            "Terms separated by spaces must all match: field:pattern[,pattern] with fields name, tag, type, suite.\n"
+            "Wildcards * and ? are allowed, a leading - excludes, a bare pattern matches the test name."
+        )
+        form.addRow("Filter tests:", self.test_filter_edit)
+
+        self.test_order_combo = QComboBox()
+        self.test_order_combo.addItems(["fail-first", "as listed"])
+        self.test_order_combo.setCurrentText(self.options["test_order"])
+        self.test_order_combo.setToolTip(
+            "fail-first: run tests that failed last time first, then cheap tests, grouped by table.\n"
+            "The report is always shown in the listed order."
+        )
+        form.addRow("Execution order:", self.test_order_combo)
+
+        self.max_failures_spin = QSpinBox()
+        self.max_failures_spin.setRange(0, 100000)
+        self.max_failures_spin.setSpecialValueText("Never")
+        self.max_failures_spin.setValue(int(self.options["max_failures"]))
+        form.addRow("Stop after failures:", self.max_failures_spin)
+
+        self.sample_mode_combo = QComboBox()
+        self.sample_mode_combo.addItems(["off", "percent", "per-key"])
+        self.sample_mode_combo.setCurrentText(self.options["sample_mode"])
+        self.sample_mode_combo.setToolTip("Smoke run against a deterministic sample of every table")
+        form.addRow("Sampled smoke run:", self.sample_mode_combo)
+
+        self.sample_percent_spin = QDoubleSpinBox()
+        self.sample_percent_spin.setRange(0.01, 100)
+        self.sample_percent_spin.setSuffix(" %")
+        self.sample_percent_spin.setValue(float(self.options["sample_percent"]))
+        form.addRow("Rows kept per table:", self.sample_percent_spin)
+
+        self.sample_key_edit = QLineEdit(self.options["sample_key"])
+        self.sample_key_edit.setPlaceholderText("Partition column (per-key mode)")
+        form.addRow("Partition key:", self.sample_key_edit)
+
+        self.sample_per_key_spin = QSpinBox()
+        self.sample_per_key_spin.setRange(1, 1000000)
+        self.sample_per_key_spin.setValue(int(self.options["sample_per_key"]))
+        form.addRow("Rows kept per key:", self.sample_per_key_spin)
+
+        self.diff_limit_spin = QSpinBox()
+        self.diff_limit_spin.setRange(0, 100000000)
+        self.diff_limit_spin.setSpecialValueText("Count all")
+        self.diff_limit_spin.setValue(int(self.options["diff_limit"]))
+        self.diff_limit_spin.setToolTip("MATCHES tests stop after this many differing rows and mark their counts '(partial)'")
+        form.addRow("Stop diff after rows:", self.diff_limit_spin)
+
+        self.failing_rows_spin = QSpinBox()
+        self.failing_rows_spin.setRange(0, 10000)
+        self.failing_rows_spin.setSpecialValueText("None")
+        self.failing_rows_spin.setValue(int(self.options["failing_rows"]))
+        self.failing_rows_spin.setToolTip("Rows of a failing SQL test's result kept for the report and its Failing Rows sheet")
+        form.addRow("Failing rows kept:", self.failing_rows_spin)
+
+        self.max_fetch_rows_spin = QSpinBox()
+        self.max_fetch_rows_spin.setRange(0, 2000000000)
+        self.max_fetch_rows_spin.setSpecialValueText("No cap")
+        self.max_fetch_rows_spin.setValue(int(self.options["max_fetch_rows"]))
+        self.max_fetch_rows_spin.setToolTip(
+            "A test whose query returns more rows is stopped with status LIMIT;\n"
+            "the manual SQL tab shows only this many rows."
+        )
+        form.addRow("Row cap per query:", self.max_fetch_rows_spin)
+
+        self.max_fetch_mb_spin = QSpinBox()
+        self.max_fetch_mb_spin.setRange(0, 1024 * 1024)
+        self.max_fetch_mb_spin.setSpecialValueText("No cap")
+        self.max_fetch_mb_spin.setSuffix(" MB")
+        self.max_fetch_mb_spin.setValue(int(self.options["max_fetch_mb"]))
+        self.max_fetch_mb_spin.setToolTip("Estimated size of the rows one query may return into the application")
+        form.addRow("Byte cap per query:", self.max_fetch_mb_spin)
+
+        self.sqlite_heap_spin = QSpinBox()
+        self.sqlite_heap_spin.setRange(0, 1024 * 1024)
+        self.sqlite_heap_spin.setSpecialValueText("No cap")
+        self.sqlite_heap_spin.setSuffix(" MB")
+        self.sqlite_heap_spin.setValue(int(self.options["sqlite_heap_mb"]))
+        self.sqlite_heap_spin.setToolTip(
+            "Memory SQLite may use for sorting, grouping and temporary results on top of what it holds\n"
+            "when the tests start (the loaded data in RAM mode).\n"
+            "A statement that needs more is stopped with status LIMIT. Not applied to environment matrix runs."
+        )
+        form.addRow("SQLite memory above data:", self.sqlite_heap_spin)
+
+        self.temp_store_spin = QSpinBox()
+        self.temp_store_spin.setRange(0, 1024 * 1024)
+        self.temp_store_spin.setSpecialValueText("No cap")
+        self.temp_store_spin.setSuffix(" MB")
+        self.temp_store_spin.setValue(int(self.options["temp_store_mb"]))
+        self.temp_store_spin.setToolTip("How much TEMP tables and indexes may grow during a run before a statement is stopped")
+        form.addRow("Temp store growth cap:", self.temp_store_spin)
+
+        layout.addLayout(form)
+        button_layout = QHBoxLayout()
+        ok_btn = QPushButton("OK")
+        ok_btn.clicked.connect(self.accept)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        button_layout.addWidget(ok_btn)
+        button_layout.addWidget(cancel_btn)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def accept(self):
+        try:
+            parse_test_filter(self.test_filter_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Filter", str(e))
+            return
+        self.options["test_filter"] = self.test_filter_edit.text().strip()
+        self.options["changed_only"] = self.changed_only_checkbox.isChecked()
+        self.options["test_timeout"] = self.test_timeout_spin.value()
+        self.options["run_timeout"] = self.run_timeout_spin.value() * 60
+        self.options["time_budget"] = self.time_budget_spin.value() * 60
+        self.options["preflight"] = self.preflight_combo.currentText()
+        self.options["index_advisor"] = self.index_advisor_combo.currentText()
+        self.options["fuse_aggregates"] = self.fuse_aggregates_checkbox.isChecked()
+        self.options["isolate_writes"] = self.isolate_writes_checkbox.isChecked()
+        self.options["resume"] = self.resume_checkbox.isChecked()
+        self.options["test_order"] = self.test_order_combo.currentText()
+        self.options["max_failures"] = self.max_failures_spin.value()
+        self.options["sample_mode"] = self.sample_mode_combo.currentText()
+        self.options["sample_percent"] = self.sample_percent_spin.value()
+        self.options["sample_key"] = self.sample_key_edit.text().strip()
+        self.options["sample_per_key"] = self.sample_per_key_spin.value()
+        self.options["diff_limit"] = self.diff_limit_spin.value()
+        self.options["failing_rows"] = self.failing_rows_spin.value()
+        self.options["max_fetch_rows"] = self.max_fetch_rows_spin.value()
+        self.options["max_fetch_mb"] = self.max_fetch_mb_spin.value()
+        self.options["sqlite_heap_mb"] = self.sqlite_heap_spin.value()
+        self.options["temp_store_mb"] = self.temp_store_spin.value()
+        super().accept()
+
 class DBModeDialog(QDialog):
     def __init__(self):
         super().__init__()
@@ -903,7 +4052,286 @@ class DBModeDialog(QDialog):
             self.selected_mode = "disk"
         super().accept()
 
+def options_from_args(args):
+    options = {"test_timeout": args.test_timeout, "run_timeout": args.run_timeout, "index_advisor": args.index_advisor,
+               "fuse_aggregates": not args.no_fusion, "test_order": args.order, "max_failures": args.max_failures,
+               "diff_limit": args.diff_limit, "update_golden": args.update_golden,
+               "failing_rows": args.failing_rows,
+               "preflight": args.preflight,
+               "isolate_writes": not args.no_isolation,
+               "resume": not args.no_resume,
+               "test_filter": args.filter or "",
+               "changed_only": args.changed_only,
+               "time_budget": args.time_budget,
+               "max_fetch_rows": args.max_fetch_rows,
+               "max_fetch_mb": args.max_fetch_mb,
+               "sqlite_heap_mb": args.sqlite_heap_mb,
+               "temp_store_mb": args.temp_store_mb}
+    if args.sample_key:
+        options.update(sample_mode="per-key", sample_key=args.sample_key, sample_per_key=args.sample_per_key,
+                       sample_percent=args.sample_percent or DEFAULT_RUN_OPTIONS["sample_percent"])
+    elif args.sample_percent:
+        options.update(sample_mode="percent", sample_percent=args.sample_percent)
+    return options
+
+
+def run_matrix_headless(args):
+    environments = {}
+    for spec in args.env:
+        name, _, paths = spec.partition("=")
+        if not name or not paths:
+            print(f"--env expects NAME=PATH[,PATH...], got '{spec}'")
+            return 2
+        environments[name.strip()] = [path.strip() for path in paths.split(",") if path.strip()]
+    try:
+        suites = load_test_suites(args.tests)
+    except ValueError as e:
+        print(e)
+        return 2
+    # Parsed once, shared by every environment
+    test_cases, fixtures = prepare_suite_test_cases(suites)
+    if args.filter:
+        try:
+            test_cases = select_test_cases(test_cases, args.filter)
+        except ValueError as e:
+            print(e)
+            return 2
+    validation_lib = load_validation_module(args.functions) if args.functions else None
+    results_by_environment = run_matrix(environments, test_cases, fixtures, validation_lib,
+                                        options_from_args(args), not args.no_cache, pipeline=args.pipeline)
+
+    for environment, results in results_by_environment.items():
+        passed = sum(1 for result in results if result["Status"] == "PASS")
+        print(f"{environment}: {passed}/{len(results)} test cases passed.")
+    rows = matrix_rows(results_by_environment)
+    differing = [row for row in rows if row["Same Everywhere"] == "no"]
+    print(f"Tests whose status differs between environments: {len(differing)}")
+    for row in differing[:20]:
+        print(f"  {row['TC Name']}: " + ", ".join(f"{env}={row.get(env, 'NOT RUN')}" for env in environments))
+    if args.report:
+        write_matrix_report(args.report, results_by_environment)
+        print(f"Matrix report saved to '{args.report}'.")
+    all_passed = all(result["Status"] == "PASS" for results in results_by_environment.values() for result in results)
+    return 0 if all_passed else 1
+
+
+def merge_reports_headless(args):
+    if not args.report:
+        print("--merge-reports needs --report for the merged report")
+        return 2
+    try:
+        count = merge_shard_reports(args.merge_reports, args.report)
+    except ValueError as e:
+        print(e)
+        return 2
+    print(f"Merged {len(args.merge_reports)} shard report(s) with {count} test case(s) into '{args.report}'.")
+    return 0
+
+
+def run_headless(args):
+    if args.env and args.shard:
+        print("--shard cannot be combined with --env")
+        return 2
+    if args.env:
+        return run_matrix_headless(args)
+    if args.db_mode == "ram":
+        db_conn = sqlite3.connect(":memory:")
+    else:
+        if os.path.exists("edm_validation_temp.db"):
+            os.remove("edm_validation_temp.db")
+        db_conn = sqlite3.connect("edm_validation_temp.db")
+
+    # With --pipeline the data is loaded by the engine, while the tests run
+    loader = PipelinedLoader(args.data) if args.pipeline else None
+    table_fingerprints = {} if loader else load_data_files(db_conn, args.data)
+
+    try:
+        suites = load_test_suites(args.tests)
+    except ValueError as e:
+        print(e)
+        return 2
+    test_cases, fixtures = prepare_suite_test_cases(suites)
+    if args.filter:
+        try:
+            test_cases = select_test_cases(test_cases, args.filter)
+        except ValueError as e:
+            print(e)
+            return 2
+        print(f"Filter '{args.filter}' selected {len(test_cases)} test case(s).")
+    listed_count = len(test_cases)
+    positions = list(range(listed_count))
+    if args.shard:
+        try:
+            shard, shard_count = parse_shard(args.shard)
+        except ValueError as e:
+            print(e)
+            return 2
+        durations = report_durations(args.shard_balance) if args.shard_balance else None
+        positions = shard_positions(test_cases, shard, shard_count, durations)
+        test_cases = [test_cases[position] for position in positions]
+        print(f"Shard {shard}/{shard_count}: {len(test_cases)} of {listed_count} test cases.")
+    validation_lib = load_validation_module(args.functions) if args.functions else None
+
+    result_cache = None if args.no_cache else ResultCache()
+    options = options_from_args(args)
+    history = RunHistory()
+    journal = RunJournal()
+    engine = ValidationEngine(db_conn, validation_lib, result_cache, table_fingerprints, options, history, fixtures,
+                              journal, loader)
+    try:
+        results = engine.run(test_cases)
+    finally:
+        if result_cache is not None:
+            result_cache.close()
+        history.close()
+        journal.close()
+        db_conn.close()
+    if args.shard:
+        # Where each result goes when the shard reports are merged
+        engine.extra_reports["Shard"] = [
+            {"Shard": f"{shard}/{shard_count}", "Position": position + 1, "Tests in Run": listed_count,
+             "TC Name": result["TC Name"]}
+            for position, result in zip(positions, results)
+        ] or [{"Shard": f"{shard}/{shard_count}", "Position": "", "Tests in Run": listed_count, "TC Name": ""}]
+
+    passed = sum(1 for result in results if result["Status"] == "PASS")
+    for row in engine.extra_reports.get("Fixtures", []):
+        print(f"Fixture '{row['Fixture']}' {row['Status']}"
+              + (f": {row['Error']}" if row["Error"] else f" ({row['Rows']} rows, {row['Build Time (s)']}s)"))
+    for row in engine.extra_reports.get("Pre-flight", []):
+        print(f"Pre-flight {row['Problem']} in '{row['TC Name']}' ({row['Action']}): {row['Error']}")
+    if engine.aborted:
+        print("Run aborted by the pre-flight check.")
+    if loader:
+        ready = [row["Ready At (s)"] for row in engine.extra_reports["Pipelined Load"]]
+        print(f"Pipelined load: {len(ready)} table(s), all loaded after {max(ready, default=0)}s; "
+              f"tests waited {engine.stats['load_wait']:.2f}s for data.")
+    if engine.stats["resumed"]:
+        print(f"Resumed an interrupted run: {engine.stats['resumed']} result(s) taken from its journal.")
+    if options["changed_only"]:
+        print(f"Unchanged tests carried forward from their last run: {engine.stats['carried_forward']}")
+    if options["time_budget"]:
+        print(f"Time budget {options['time_budget']:g}s: {engine.stats['budget_skipped']} test case(s) skipped.")
+        skipped = [row for row in engine.extra_reports["Time Budget"] if row["Decision"] == "skipped"]
+        for row in skipped[:20]:
+            print(f"  skipped {row['TC Name']} (priority {row['Priority']}): {row['Reason']}")
+        if len(skipped) > 20:
+            print(f"  ... and {len(skipped) - 20} more (see the Time Budget sheet of the report)")
+    if options.get("sample_mode", "off") != "off":
+        print(f"SAMPLED RUN ({engine.sample_description()}) - not a full validation.")
+    print(f"{passed}/{len(results)} test cases passed.")
+    suite_rows = suite_summary(results)
+    if len(suite_rows) > 1:
+        for row in suite_rows:
+            print(f"  Suite {row['Suite']}: {row['PASS']}/{row['Tests']} passed ({row['Time (s)']}s)")
+    for status in ("FAIL", "ERROR", "TIMEOUT", "LIMIT", "SKIPPED"):
+        count = sum(1 for result in results if result["Status"] == status)
+        if count:
+            print(f"  {status}: {count}")
+    print(f"Queries executed: {engine.stats['executions']}, "
+          f"duplicate executions saved: {engine.stats['executions_saved']}, "
+          f"results reused from cache: {engine.stats['cache_hits']}, "
+          f"tests answered by shared scans: {engine.stats['fused_tests']}, "
+          f"mutating tests rolled back: {engine.stats['isolated_tests']}")
+    slowest_rows, _ = performance_summary(results, top_n=5)
+    if slowest_rows:
+        print("Slowest test cases:")
+        for row in slowest_rows:
+            print(f"  {row['Duration (s)']:>10.3f}s  {row['TC Name']}")
+    for row in engine.extra_reports.get("Index Advisor", []):
+        print(f"Index advisor ({row['Status']}): {row['Index']} -- {row['Tests Affected']} test(s), speedup {row['Speedup'] or 'n/a'}")
+    if args.report:
+        write_report(args.report, results, engine.extra_reports)
+        print(f"Validation report saved to '{args.report}'.")
+    return 0 if passed == len(results) else 1
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="PyValiData – Excel Data Validation Studio")
+    parser.add_argument("--tests", nargs="+",
+                        help="Test case Excel file(s), every TC sheet a suite; runs headless without the GUI")
+    parser.add_argument("--data", nargs="*", default=[], help="Excel data file(s) to load")
+    parser.add_argument("--functions", help="Path to validation_functions.py for KEYWORD tests")
+    parser.add_argument("--report", help="Excel file to save the validation report to")
+    parser.add_argument("--db-mode", choices=["ram", "disk"], default="ram")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update the result cache")
+    parser.add_argument("--test-timeout", type=float, default=0, help="Seconds allowed per test (0 = no limit)")
+    parser.add_argument("--run-timeout", type=float, default=0, help="Seconds allowed for the whole run (0 = no limit)")
+    parser.add_argument("--time-budget", type=float, default=0,
+                        help="Seconds to spend: run the highest-value tests that fit (Priority column, then failed and "
+                             "new tests, cheapest first) using past durations, and list what was skipped and why")
+    parser.add_argument("--index-advisor", choices=["off", "report", "auto"], default="off",
+                        help="Propose (report) or create (auto) indexes for scanned tables")
+    parser.add_argument("--no-fusion", action="store_true",
+                        help="Run every aggregate test on its own instead of sharing table scans")
+    parser.add_argument("--order", choices=["fail-first", "as listed"], default="fail-first",
+                        help="Execution order; the report always keeps the listed order")
+    parser.add_argument("--max-failures", type=int, default=0, help="Stop after N failing tests (0 = never)")
+    parser.add_argument("--sample-percent", type=float, default=0,
+                        help="Smoke run against a deterministic sample of this percent of rows per table")
+    parser.add_argument("--sample-key", help="Smoke run keeping the first rows per value of this column")
+    parser.add_argument("--sample-per-key", type=int, default=DEFAULT_RUN_OPTIONS["sample_per_key"],
+                        help="Rows kept per key value with --sample-key")
+    parser.add_argument("--diff-limit", type=int, default=0,
+                        help="Stop MATCHES diffs after N differing rows (0 = count them all)")
+    parser.add_argument("--update-golden", action="store_true",
+                        help="Re-baseline: write the current result of every GOLDEN test as its snapshot")
+    parser.add_argument("--failing-rows", type=int, default=DEFAULT_RUN_OPTIONS["failing_rows"],
+                        help="Rows of a failing SQL test's result kept for the report (0 = none)")
+    parser.add_argument("--max-fetch-rows", type=int, default=0,
+                        help="Rows one query may return; a test over it gets status LIMIT (0 = no cap)")
+    parser.add_argument("--max-fetch-mb", type=float, default=0,
+                        help="Estimated MB one query may return; a test over it gets status LIMIT (0 = no cap)")
+    parser.add_argument("--sqlite-heap-mb", type=float, default=0,
+                        help="MB SQLite may allocate above what it holds when the tests start; a statement needing "
+                             "more gets status LIMIT (0 = no cap, ignored with --env)")
+    parser.add_argument("--temp-store-mb", type=float, default=0,
+                        help="MB TEMP tables and indexes may grow by during the run; a statement over it gets status "
+                             "LIMIT (0 = no cap)")
+    parser.add_argument("--preflight", choices=["off", "report", "error", "abort"],
+                        default=DEFAULT_RUN_OPTIONS["preflight"],
+                        help="Prepare all SQL before running: report problems, mark those tests ERROR, or abort")
+    parser.add_argument("--no-isolation", action="store_true",
+                        help="Let mutating SQL tests change the data later tests see (no savepoint rollback)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Start over even if an interrupted run of the same tests on the same data was journaled")
+    parser.add_argument("--partial-report", metavar="FILE",
+                        help="Write the results journaled so far by the latest unfinished run to FILE and exit; "
+                             "works while that run is still going")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Load the data files while validating: each test starts once its tables are loaded, "
+                             "and sheets are loaded in the order that unblocks the most tests")
+    parser.add_argument("--filter", metavar="EXPR",
+                        help="Run only matching tests: space-separated terms that must all match, each "
+                             "field:pattern[,pattern] with fields name, tag, type, suite (wildcards allowed, "
+                             "leading - excludes), e.g. \"tag:smoke type:sql -name:*_slow\"")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="Run only new or edited tests; unchanged ones keep their last result on the same data")
+    parser.add_argument("--shard", metavar="I/N",
+                        help="Run only shard I of N (e.g. 2/4); tests are assigned by a hash of their name, the same "
+                             "on every host. Merge the shard reports with --merge-reports")
+    parser.add_argument("--shard-balance", metavar="REPORT",
+                        help="Balance --shard by the test durations in an earlier report; give every shard the same file")
+    parser.add_argument("--merge-reports", nargs="+", metavar="SHARD_REPORT",
+                        help="Merge the reports of all shards of a run into --report and exit")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=PATH[,PATH...]",
+                        help="Matrix mode: run the suites against each environment's data files (or folders of "
+                             "them) in parallel; repeat per environment. Files must keep the same names across "
+                             "environments so the table names match")
+    # Leave Qt's own options (e.g. -style) to QApplication
+    args, _ = parser.parse_known_args(argv)
+    return args
+
 if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.partial_report:
+        count = write_partial_report(args.partial_report)
+        print(f"Partial report with {count} result(s) written to {args.partial_report}" if count
+              else "No unfinished run has journaled results.")
+        sys.exit(0 if count else 1)
+    if args.merge_reports:
+        sys.exit(merge_reports_headless(args))
+    if args.tests:
+        sys.exit(run_headless(args))
     app = QApplication(sys.argv)
     mode_dialog = DBModeDialog()
     db_mode = "disk"
@@ -911,6 +4339,6 @@ if __name__ == "__main__":
         db_mode = mode_dialog.selected_mode
     else:
         sys.exit(0)
-    ex = ExcelSQLValidatorApp(db_mode=db_mode)
+    ex = ExcelSQLValidatorApp(db_mode=db_mode, use_cache=not args.no_cache)
     ex.show()
     sys.exit(app.exec_())